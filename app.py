@@ -1,30 +1,35 @@
 import os
-import subprocess
-from datetime import datetime
+import json
+import hashlib
 import zoneinfo
-import time
-from threading import Event
-import asyncio
 import logging
 import sdnotify  # Add this import
 
-from flask import Flask, render_template, jsonify, send_from_directory
+from flask import (
+    Flask,
+    render_template,
+    jsonify,
+    request,
+    send_from_directory,
+    send_file,
+    url_for,
+)
 from flask_socketio import SocketIO, emit
 from dotenv import load_dotenv
 from myroonapi import MyRoonApi
-from art_generator import generate_mondrian
+from notifier import NotificationDispatcher
+from display import DisplayManager, create_backend, is_screen_on  # noqa: F401
+from slideshow import SlideshowCatalogue, SlideshowDerivatives, SlideshowScheduler
+from art_generator import STYLES, ArtPool, ArtStore
+from artcache import sniff_mimetype
 
 # Load environment variables from .env file
 load_dotenv()
 
 my_tz = zoneinfo.ZoneInfo(os.getenv("TZ", "America/New_York"))
 
-myRoonApi = MyRoonApi()
-
 app = Flask(__name__)
-socketio = SocketIO(app, cors_allowed_origins="*")
-thread = None
-thread_stop_event = Event()
+socketio = SocketIO(cors_allowed_origins="*")
 
 name = os.getenv("NAME", "roFrame")
 port = int(os.getenv("PORT", 5006))
@@ -35,6 +40,10 @@ slideshow_enabled = os.getenv("SLIDESHOW", "on") == "on"
 slideshow_folder = os.getenv(
     "SLIDESHOW_FOLDER", os.path.join(app.root_path, "./pictures")
 )
+cache_folder = os.getenv("CACHE_FOLDER", os.path.join(app.root_path, "cache"))
+display_width = int(os.getenv("DISPLAY_WIDTH", 1024))
+display_height = int(os.getenv("DISPLAY_HEIGHT", 600))
+slideshow_batch_size = int(os.getenv("SLIDESHOW_BATCH_SIZE", 20))
 slideshow_transition_seconds = int(os.getenv("SLIDESHOW_TRANSITION_SECONDS", 15))
 slideshow_clock_ratio = int(os.getenv("SLIDESHOW_CLOCK_RATIO", 0)) / 100
 
@@ -43,11 +52,77 @@ clock_offset = int(os.getenv("CLOCK_OFFSET", 0))
 
 index_file = os.getenv("INDEX_FILE", "index.html")
 
+# Built by create_app(). Render workers are started from a fork server and
+# import this module again, so importing it must not connect to Roon, touch
+# the display or the caches.
+myRoonApi = None
+# The last album_update sent, so new pages and sockets start with it
+album_snapshot = {}
+slideshow_catalogue = None
+slideshow_scheduler = None
+art_store = None
+art_pool = None
+art_scheduler = None
+slideshow_derivatives = None
+display_manager = None
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def create_app():
+    """Set up the Roon connection, display and slideshow the routes use"""
+    global myRoonApi, album_snapshot, display_manager
+    global slideshow_catalogue, slideshow_scheduler, slideshow_derivatives
+    global art_store, art_pool, art_scheduler
+
+    myRoonApi = MyRoonApi()
+    album_snapshot = myRoonApi.cached_zone_data() or {}
+    socketio.init_app(app)
+
+    slideshow_catalogue = SlideshowCatalogue(slideshow_folder)
+    slideshow_scheduler = SlideshowScheduler(
+        slideshow_catalogue,
+        os.path.join(cache_folder, "slideshow_state.json"),
+        history=int(os.getenv("SLIDESHOW_HISTORY", 100)),
+        clock_ratio=slideshow_clock_ratio,
+        recent_days=int(os.getenv("SLIDESHOW_RECENT_DAYS", 30)),
+        recent_weight=float(os.getenv("SLIDESHOW_RECENT_WEIGHT", 1)),
+    )
+    art_store = ArtStore(
+        os.path.join(cache_folder, "generated"), display_width, display_height
+    )
+    art_styles = os.getenv("ART_STYLES", "mondrian,albers,gradient,voronoi")
+    art_pool = ArtPool(
+        art_store,
+        int(os.getenv("ART_POOL_SIZE", 10)),
+        int(os.getenv("ART_POOL_REFRESH_MINUTES", 60)) * 60,
+        [style.strip() for style in art_styles.split(",") if style.strip() in STYLES],
+    )
+    art_scheduler = SlideshowScheduler(
+        art_pool,
+        os.path.join(cache_folder, "art_state.json"),
+        history=int(os.getenv("SLIDESHOW_HISTORY", 100)),
+        clock_ratio=slideshow_clock_ratio,
+    )
+    slideshow_derivatives = None
+    if os.getenv("SLIDESHOW_RESIZE", "on") == "on":
+        slideshow_derivatives = SlideshowDerivatives(
+            slideshow_catalogue,
+            os.path.join(cache_folder, "slideshow"),
+            display_width,
+            display_height,
+            os.getenv("SLIDESHOW_FORMAT", "webp"),
+        )
+
+    display_backend = create_backend(display_control)
+    display_manager = DisplayManager(
+        display_backend.set_power, display_on_hour, display_off_hour, my_tz
+    )
+    return app
+
+
 def getRoonApi():
     global myRoonApi
 
@@ -58,64 +133,18 @@ def getRoonApi():
     return myRoonApi
 
 
-def display(turn_on):
-    """Function to control the display"""
-    state = "on" if turn_on else "off"
-    if display_control == "on":
-        subprocess.check_output(["xset", "dpms", "force", state])
-    logger.info(f"display: {state}")
-
-
-def is_screen_on(current_hour, on_hour, off_hour):
-    if on_hour == off_hour:
-        return False  # Device should be off if on and off hours are the same
-    if on_hour < off_hour:
-        return on_hour <= current_hour < off_hour  # Normal range
-    else:
-        return not (off_hour <= current_hour < on_hour)  # Overnight case
-
-
-def background_thread():
-    """
-    A background thread that emits a message every 10 minutes.
-    """
-    while not thread_stop_event.is_set():
-        myRoonApi = getRoonApi()
-        album = myRoonApi.get_zone_data()
-        state = album.get("state")
-        current_hour = datetime.now().astimezone(my_tz).hour
-
-        # Turn off screen during certain hours
-        if state in ["playing", "loading"] or is_screen_on(
-            current_hour, display_on_hour, display_off_hour
-        ):
-            display(True)
-        else:
-            display(False)
-
-        time.sleep(600)
-
-
 @app.route("/")
 def index():
-    images = []
-    art_images = []
-    if slideshow_enabled:
-        images = os.listdir(slideshow_folder)
-        image_extensions = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tiff"}
-        images = [
-            img
-            for img in images
-            if os.path.splitext(img)[1].lower() in image_extensions
-        ]
-        if not images:
-            art_images = [generate_mondrian() for _ in range(10)]
-
+    album = album_snapshot
     return render_template(
         index_file,
         name=name,
-        images=images,
-        art_images=art_images,
+        album=album,
+        album_playing=album.get("state") in ["playing", "loading"],
+        album_cover_url=album.get("url", ""),
+        album_artist=album.get("artist", ""),
+        album_title=album.get("title", ""),
+        album_track=album.get("track", ""),
         transition_seconds=slideshow_transition_seconds,
         slideshow_clock_ratio=slideshow_clock_ratio,
         clock_size=clock_size,
@@ -123,13 +152,99 @@ def index():
     )
 
 
+def picture_url(slide):
+    return url_for("slideshow_pic", filename=slide)
+
+
+def art_url(slide):
+    style, seed = ArtPool.split(slide)
+    return url_for("generated_art", style=style, seed=seed)
+
+
+@app.route("/slideshow/manifest")
+def slideshow_manifest():
+    """
+    Page through the slides the scheduler has lined up.
+
+    The same cursor always returns the same slides, so responses carry an
+    ETag. A null url is a clock slide.
+    """
+    limit = request.args.get("limit", slideshow_batch_size, type=int)
+    # An empty page would hand back the same cursor forever
+    limit = max(1, min(limit, 100))
+    cursor = request.args.get("cursor", type=int)
+    if not slideshow_enabled:
+        return jsonify({"items": [], "next_cursor": None})
+
+    if slideshow_catalogue.names():
+        scheduler, url = slideshow_scheduler, picture_url
+    else:
+        # No pictures, show some modern art instead
+        scheduler, url = art_scheduler, art_url
+
+    cursor, slides = scheduler.upcoming(cursor, limit)
+    page = {
+        "items": [
+            (
+                {"type": "clock"}
+                if slide is None
+                else {
+                    "type": "picture",
+                    "url": url(slide),
+                }
+            )
+            for slide in slides
+        ],
+        "next_cursor": cursor + len(slides),
+    }
+    response = jsonify(page)
+    # From the slides themselves, a cursor may be reused after a restart
+    etag = json.dumps(page, sort_keys=True)
+    response.set_etag(hashlib.sha1(etag.encode()).hexdigest())
+    return response.make_conditional(request)
+
+
 @app.route("/slideshow/<filename>")
 def slideshow_pic(filename):
-    if filename not in os.listdir(slideshow_folder):
+    if filename not in slideshow_catalogue:
         return jsonify({"error": "File not found"}), 404
+    if slideshow_derivatives:
+        path = slideshow_derivatives.get(filename)
+        if path:
+            return send_file(path, mimetype=slideshow_derivatives.mimetype)
     return send_from_directory(slideshow_folder, filename)
 
 
+@app.route("/art/<image_key>")
+def album_art(image_key):
+    """Serve album art from the local cache, fetching it from Roon once."""
+    path = getRoonApi().get_art(image_key)
+    if path is None:
+        return jsonify({"error": "File not found"}), 404
+    # Roon image keys identify the image content, so they never go stale
+    response = send_file(
+        path, mimetype=sniff_mimetype(path), etag=image_key, conditional=True
+    )
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+@app.route("/art/generated/<style>/<int(max=4294967295):seed>.png")
+def generated_art(style, seed):
+    """Serve the generated art of the pool, the style and seed determine it"""
+    # Only what the pool rendered, never render or store one per request
+    if ArtPool.name(style, seed) not in art_pool:
+        return jsonify({"error": "File not found"}), 404
+    response = send_file(
+        art_store.path(style, seed),
+        mimetype=art_store.mimetype,
+        etag=art_store.key(style, seed),
+        conditional=True,
+    )
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
 @app.route("/static/<path:filename>")
 def static_files(filename):
     """Serve static files from the static directory."""
@@ -140,11 +255,8 @@ def static_files(filename):
 def handle_connect():
     logger.info("Socket client connected")
     emit("response", {"data": "Connected"})
-
-    # Start the background thread if it’s not running yet
-    global thread
-    if thread is None or not thread.is_alive():
-        thread = socketio.start_background_task(background_thread)
+    if album_snapshot:
+        emit("album_update", album_snapshot)
 
 
 @socketio.on("disconnect")
@@ -157,21 +269,31 @@ def trigger_album_update():
     logger.info("trigger_album_update")
     myRoonApi = getRoonApi()
     album = myRoonApi.get_zone_data()
-    asyncio.run(notify_clients(album))  # Use asyncio.run to await the coroutine
+    notify_clients(album)
 
-    if album["state"] in ["playing", "loading"]:
-        display(True)
 
-
-async def notify_clients(message):
-    logger.info("notify_clients")
+def deliver(event, message):
+    """Send an event to the clients, called from the dispatcher task"""
+    logger.info(f"deliver {event}")
     logger.info(message)
-    socketio.emit("album_update", message)
-    if message.get("state") in ["playing", "loading"]:
-        display(True)
+    socketio.emit(event, message)
+    display_manager.set_playback(message.get("state"))
+
+
+dispatcher = NotificationDispatcher(
+    deliver, maxsize=int(os.getenv("NOTIFY_QUEUE_SIZE", 64))
+)
+
+
+def notify_clients(message):
+    """Queue an album update for the clients, never blocks"""
+    global album_snapshot
+    album_snapshot = message
+    dispatcher.post("album_update", message)
 
 
 if __name__ == "__main__":
+    create_app()
     # start the Roon
     if not myRoonApi.check_auth():
         logger.error("Please authorise first using discovery.py")
@@ -184,6 +306,16 @@ if __name__ == "__main__":
     n = sdnotify.SystemdNotifier()
     n.notify("READY=1")
 
+    dispatcher.start(socketio.start_background_task)
+    album = myRoonApi.get_zone_data()
+    if album:
+        notify_clients(album)
+    display_manager.start(socketio.start_background_task)
+    if slideshow_enabled and slideshow_derivatives:
+        slideshow_derivatives.schedule_all()
+    if slideshow_enabled:
+        art_pool.start()
+
     # Start the Flask web server
     socketio.run(
         app, debug=False, port=port, host="0.0.0.0", allow_unsafe_werkzeug=True
@@ -1,85 +1,559 @@
 #!/usr/bin/env python3
 
-import random
-from PIL import Image, ImageDraw
 import io
+import os
+import sys
 import base64
+import random
+import time
+import logging
+import argparse
+import colorsys
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from PIL import Image, ImageDraw
 
+# Palette of colors typical of Mondrian: White, Red, Blue, Yellow, Black
+WHITE, RED, BLUE, YELLOW, BLACK = range(5)
+MONDRIAN_PALETTE = [
+    255, 255, 255,
+    237, 28, 36,
+    63, 72, 204,
+    255, 242, 0,
+    0, 0, 0,
+]  # fmt: skip
 
-def generate_mondrian(width=1024, height=600):
+
+def render_mondrian(width=1024, height=600, seed=None):
     """
-    Generates a Piet Mondrian-style image of size (width x height).
-    Returns the result as a base64 encoded GIF image.
+    Draws a Piet Mondrian-style image of size (width x height).
+    Returns a "P" mode PIL image, the same seed always gives the same image.
+
+    The image is built from palette indexes with one paste per cell and line,
+    so saving it as GIF or PNG needs no quantization.
     """
+    rng = random.Random(seed)
 
-    # Create a new white background image
-    img = Image.new("RGB", (width, height), (255, 255, 255))
-    draw = ImageDraw.Draw(img)
+    img = Image.new("P", (width, height), WHITE)
+    img.putpalette(MONDRIAN_PALETTE)
 
     # Number of randomly placed vertical and horizontal lines
-    num_vertical_lines = random.randint(3, 5)
-    num_horizontal_lines = random.randint(2, 4)
+    num_vertical_lines = rng.randint(3, 5)
+    num_horizontal_lines = rng.randint(2, 4)
 
     # Randomly generate line positions (excluding outer edges to avoid duplication)
     # We will add the outer edges (0 and width/height) to the list to form grid boundaries
-    vertical_lines = sorted(random.sample(range(100, width - 100), num_vertical_lines))
+    vertical_lines = sorted(rng.sample(range(100, width - 100), num_vertical_lines))
     horizontal_lines = sorted(
-        random.sample(range(100, height - 100), num_horizontal_lines)
+        rng.sample(range(100, height - 100), num_horizontal_lines)
     )
 
     # Include the extreme edges for the grid
     vertical_lines = [0] + vertical_lines + [width]
     horizontal_lines = [0] + horizontal_lines + [height]
 
-    # Define a palette of colors typical of Mondrian
-    # White, Red, Blue, Yellow
-    palette = [
-        (255, 255, 255),  # White
-        (237, 28, 36),  # Red
-        (63, 72, 204),  # Blue
-        (255, 242, 0),  # Yellow
-    ]
     # Weights for how often each color is chosen (e.g., more white space)
     # Adjust to taste
+    colors = [WHITE, RED, BLUE, YELLOW]
     weights = [0.6, 0.15, 0.15, 0.1]
 
     # Iterate over the grid cells defined by our lines
     for i in range(len(vertical_lines) - 1):
         for j in range(len(horizontal_lines) - 1):
-            left = vertical_lines[i]
-            right = vertical_lines[i + 1]
-            top = horizontal_lines[j]
-            bottom = horizontal_lines[j + 1]
+            fill_color = rng.choices(colors, weights=weights, k=1)[0]
+            if fill_color != WHITE:
+                img.paste(
+                    fill_color,
+                    (
+                        vertical_lines[i],
+                        horizontal_lines[j],
+                        vertical_lines[i + 1],
+                        horizontal_lines[j + 1],
+                    ),
+                )
 
-            # Randomly pick a color for this cell
-            fill_color = random.choices(palette, weights=weights, k=1)[0]
+    # Now draw the black grid lines on top, centered on the cell edges
+    line_thickness = rng.choice([4, 6, 8])  # or pick a fixed thickness
+    half = line_thickness // 2
+    for x in vertical_lines:
+        img.paste(BLACK, (max(x - half, 0), 0, min(x + half, width), height))
+    for y in horizontal_lines:
+        img.paste(BLACK, (0, max(y - half, 0), width, min(y + half, height)))
 
-            # Fill the cell with the chosen color
-            draw.rectangle([left, top, right, bottom], fill=fill_color)
+    return img
 
-    # Now draw the black grid lines on top
-    line_thickness = random.choice([4, 6, 8])  # or pick a fixed thickness
-    black = (0, 0, 0)
 
-    # Draw vertical lines
-    for x in vertical_lines:
-        draw.line([(x, 0), (x, height)], fill=black, width=line_thickness)
-    # Draw horizontal lines
-    for y in horizontal_lines:
-        draw.line([(0, y), (width, y)], fill=black, width=line_thickness)
+def hsl_palette(colors):
+    """Flattens (hue, lightness, saturation) tuples into a putpalette list"""
+    palette = []
+    for hue, lightness, saturation in colors:
+        rgb = colorsys.hls_to_rgb(hue % 1, lightness, saturation)
+        palette.extend(round(c * 255) for c in rgb)
+    return palette
+
+
+def render_albers(width=1024, height=600, seed=None):
+    """
+    Draws nested squares after Josef Albers' Homage to the Square, in shades
+    of one random hue. Returns a "P" mode PIL image.
+    """
+    rng = random.Random(seed)
+    hue = rng.random()
+    lightness = sorted(rng.uniform(0.2, 0.85) for _ in range(4))
+    if rng.random() < 0.5:
+        lightness.reverse()
+    img = Image.new("P", (width, height), 0)
+    img.putpalette(
+        hsl_palette(
+            (hue + rng.uniform(-0.04, 0.04), shade, rng.uniform(0.4, 0.9))
+            for shade in lightness
+        )
+    )
+
+    # The outer square fills the short side, the inner ones sit low in it
+    side = min(width, height)
+    left = (width - side) // 2
+    top = (height - side) // 2
+    for index, scale in enumerate([0.8, 0.6, 0.4], start=1):
+        inner = round(side * scale)
+        x = left + (side - inner) // 2
+        y = top + round((side - inner) * 0.75)
+        img.paste(index, (x, y, x + inner, y + inner))
+
+    return img
+
+
+def render_gradient(width=1024, height=600, seed=None):
+    """
+    Draws a smooth field blending a linear gradient at a random angle with a
+    radial one around a random point. Returns a "P" mode PIL image.
+    """
+    rng = random.Random(seed)
 
-    # Save the image to a bytes buffer
+    # Rotate a larger square and crop it so the corners are never empty
+    linear = Image.linear_gradient("L").resize((364, 364))
+    linear = linear.rotate(rng.uniform(0, 360), Image.Resampling.BICUBIC)
+    linear = linear.crop((54, 54, 310, 310))
+    cx, cy = rng.randint(0, 128), rng.randint(0, 128)
+    radial = Image.radial_gradient("L").resize((512, 512))
+    radial = radial.crop((cx + 64, cy + 64, cx + 320, cy + 320))
+    field = Image.blend(linear, radial, rng.uniform(0.2, 0.6))
+    img = field.resize((width, height), Image.Resampling.BILINEAR)
+
+    # 256 palette entries running through three random colors
+    stops = [
+        (rng.random(), rng.uniform(0.25, 0.75), rng.uniform(0.5, 1)) for _ in range(3)
+    ]
+    colors = []
+    for i in range(256):
+        t = i / 255 * 2
+        a, b = stops[int(min(t, 1.999))], stops[int(min(t, 1.999)) + 1]
+        f = t - int(min(t, 1.999))
+        colors.append(tuple(a[k] + (b[k] - a[k]) * f for k in range(3)))
+    img.putpalette(hsl_palette(colors))
+    return img
+
+
+def clip(polygon, a, b, c):
+    """Clips a convex polygon to the half-plane a*x + b*y <= c"""
+    clipped = []
+    for k, (x1, y1) in enumerate(polygon):
+        x2, y2 = polygon[(k + 1) % len(polygon)]
+        d1, d2 = a * x1 + b * y1 - c, a * x2 + b * y2 - c
+        if d1 <= 0:
+            clipped.append((x1, y1))
+        if (d1 < 0) != (d2 < 0) and d1 != d2:
+            t = d1 / (d1 - d2)
+            clipped.append((x1 + (x2 - x1) * t, y1 + (y2 - y1) * t))
+    return clipped
+
+
+def render_voronoi(width=1024, height=600, seed=None):
+    """
+    Draws flat Voronoi cells around random points. Returns a "P" mode PIL image.
+
+    Each cell is the image rectangle clipped by the half-planes closer to its
+    point than to every other point, then filled as one polygon.
+    """
+    rng = random.Random(seed)
+    sites = [
+        (rng.uniform(0, width), rng.uniform(0, height))
+        for _ in range(rng.randint(12, 30))
+    ]
+    hue = rng.random()
+    img = Image.new("P", (width, height), 0)
+    img.putpalette(
+        hsl_palette(
+            (hue + rng.uniform(-0.15, 0.15), rng.uniform(0.3, 0.8), 0.7) for _ in sites
+        )
+    )
+    draw = ImageDraw.Draw(img)
+    for index, (x, y) in enumerate(sites):
+        cell = [(0, 0), (width, 0), (width, height), (0, height)]
+        for other_x, other_y in sites:
+            if (other_x, other_y) == (x, y) or not cell:
+                continue
+            a, b = other_x - x, other_y - y
+            c = (a * (x + other_x) + b * (y + other_y)) / 2
+            cell = clip(cell, a, b, c)
+        if len(cell) > 2:
+            draw.polygon(cell, fill=index)
+    return img
+
+
+def encode(img, format="gif"):
+    """Returns img encoded as a gif, png or webp file"""
     buffer = io.BytesIO()
-    img.save(buffer, format="GIF")
-    buffer.seek(0)
+    if format == "webp":
+        img.convert("RGB").save(buffer, format="WEBP", lossless=True)
+    elif format == "png":
+        img.save(buffer, format="PNG", optimize=False)
+    else:
+        img.save(buffer, format="GIF")
+    return buffer.getvalue()
+
+
+def generate_mondrian(width=1024, height=600, seed=None):
+    """
+    Generates a Piet Mondrian-style image of size (width x height).
+    Returns the result as a base64 encoded GIF image.
+    """
+    data = encode(render_mondrian(width, height, seed), "gif")
 
     # Encode the image to base64
-    img_base64 = base64.b64encode(buffer.read()).decode("utf-8")
+    img_base64 = base64.b64encode(data).decode("utf-8")
 
     # Return the base64 string
     return f"data:image/gif;base64,{img_base64}"
 
 
+STYLES = {
+    "mondrian": render_mondrian,
+    "albers": render_albers,
+    "gradient": render_gradient,
+    "voronoi": render_voronoi,
+}
+
+
+def generate(seed, width=1024, height=600, style="mondrian", format="png"):
+    """
+    Returns the encoded image for seed, drawn in style at width x height.
+    The same arguments always give the same bytes.
+    """
+    return encode(STYLES[style](width, height, seed), format)
+
+
+def render_file(path, seed, width, height, style, format):
+    """Writes the generated image to path, runs in a worker process"""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(generate(seed, width, height, style, format))
+    os.replace(tmp, path)
+    return path
+
+
+class Artwork(NamedTuple):
+    name: str
+    size: int
+    mtime: float
+
+
+class ArtStore:
+    """
+    Generated images on disk, addressed by what they are generated from.
+
+    Generation is deterministic, so the key (style, size, seed) names the
+    content: a stored file never changes and can be cached forever.
+    """
+
+    MIMETYPES = {"gif": "image/gif", "png": "image/png", "webp": "image/webp"}
+    # Images rendered by `art_generator.py --batch`, one "<style>-<seed>" a line
+    BATCH_LIST = "batch.txt"
+    # Renders take seconds, an older temp file was left by a crash. A newer
+    # one may be written right now by the server or a `--batch` run.
+    STALE_TMP_SECONDS = 3600
+
+    def __init__(
+        self,
+        folder: str,
+        width: int = 1024,
+        height: int = 600,
+        format: str = "png",
+    ) -> None:
+        self.folder = folder
+        self.width = width
+        self.height = height
+        self.format = format
+        self.mimetype = self.MIMETYPES[format]
+        os.makedirs(folder, exist_ok=True)
+        stale = time.time() - self.STALE_TMP_SECONDS
+        for entry in os.scandir(folder):
+            if not entry.name.endswith(".tmp"):
+                continue
+            try:
+                if entry.stat().st_mtime < stale:
+                    os.remove(entry.path)
+            except OSError:
+                pass  # renamed or removed by its writer meanwhile
+
+    def key(self, style: str, seed: int) -> str:
+        return f"{style}-{self.width}x{self.height}-{seed}"
+
+    def path(self, style: str, seed: int) -> str:
+        return os.path.join(self.folder, f"{self.key(style, seed)}.{self.format}")
+
+    def batch(self) -> List[Tuple[str, int]]:
+        """(style, seed) of the stored images pre-rendered with --batch"""
+        try:
+            with open(os.path.join(self.folder, self.BATCH_LIST)) as f:
+                lines = f.read().split()
+        except FileNotFoundError:
+            return []
+        found = []
+        for line in lines:
+            style, _, seed = line.partition("-")
+            if style in STYLES and seed.isdigit():
+                entry = (style, int(seed))
+                if entry not in found and os.path.exists(self.path(*entry)):
+                    found.append(entry)
+        return found
+
+    def add_batch(self, jobs: Iterable[Tuple[str, int]]) -> None:
+        """Record rendered images as pre-rendered, never to be deleted"""
+        with open(os.path.join(self.folder, self.BATCH_LIST), "a") as f:
+            f.writelines(f"{style}-{seed}\n" for style, seed in jobs)
+
+    def get(self, style: str, seed: int) -> str:
+        """Path of the image for style and seed, generating it if needed"""
+        path = self.path(style, seed)
+        if not os.path.exists(path):
+            render_file(path, seed, self.width, self.height, style, self.format)
+        return path
+
+    def render_batch(
+        self, jobs: Iterable[Tuple[str, int]], workers: Optional[int] = None
+    ) -> None:
+        """Generate the missing (style, seed) images on all cores"""
+        missing = [job for job in jobs if not os.path.exists(self.path(*job))]
+        if len(missing) < 2:
+            for style, seed in missing:
+                self.get(style, seed)
+            return
+        # Not forked, the server calling this runs other threads holding locks
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("forkserver")
+        ) as pool:
+            futures = [
+                pool.submit(
+                    render_file,
+                    self.path(style, seed),
+                    seed,
+                    self.width,
+                    self.height,
+                    style,
+                    self.format,
+                )
+                for style, seed in missing
+            ]
+            for future in futures:
+                future.result()
+
+    def discard(self, style: str, seed: int) -> None:
+        try:
+            os.remove(self.path(style, seed))
+        except OSError:
+            pass
+
+    def entries(self) -> List[Tuple[str, int]]:
+        """(style, seed) of the stored images, oldest first"""
+        size = f"{self.width}x{self.height}"
+        suffix = f".{self.format}"
+        found = []
+        for entry in os.scandir(self.folder):
+            if not entry.name.endswith(suffix):
+                continue
+            parts = entry.name[: -len(suffix)].split("-")
+            if len(parts) != 3 or parts[0] not in STYLES or parts[1] != size:
+                continue
+            if parts[2].isdigit():
+                found.append((entry.stat().st_mtime, parts[0], int(parts[2])))
+        return [(style, seed) for _, style, seed in sorted(found)]
+
+
+class ArtPool:
+    """
+    The generated art shown when there are no slideshow pictures.
+
+    A background worker fills the pool up to `size` images, each a random
+    seed drawn in one of `styles` and rendered into the store by a process
+    pool, and then replaces the oldest one every refresh_seconds, so the art
+    changes over time without anything being drawn while a page loads.
+    Replaced images stay in the store for one more round so browsers that
+    already have their URL can still load them.
+
+    Images pre-rendered with `--batch` are shown too, on top of the `size`
+    the pool rotates, and never replaced or deleted. Anything else in the
+    store is deleted, so it never holds more than 2 * size images besides
+    the batch. Names are "<style>-<seed>", with the same names()/get()/version
+    interface as SlideshowCatalogue.
+    """
+
+    SEED_LIMIT = 2**32
+
+    def __init__(
+        self,
+        store: ArtStore,
+        size: int = 10,
+        refresh_seconds: float = 3600,
+        styles: Optional[List[str]] = None,
+        workers: Optional[int] = None,
+    ) -> None:
+        self.store = store
+        self.size = size
+        self.refresh_seconds = refresh_seconds
+        self.styles = styles or list(STYLES)
+        self.workers = workers
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.random = random.Random()
+        self.version = 0
+        self.entries: List[Tuple[str, int]] = []
+        self.artworks: Dict[str, Artwork] = {}
+        self.batch = store.batch()
+        for entry in self.batch:
+            self.__remember(*entry)
+        for entry in store.entries():
+            if entry not in self.batch:
+                self.entries.append(entry)
+                self.__remember(*entry)
+        self.__trim()
+        self.version += 1
+        self.prune()
+
+    @staticmethod
+    def name(style: str, seed: int) -> str:
+        return f"{style}-{seed}"
+
+    @staticmethod
+    def split(name: str) -> Tuple[str, int]:
+        style, seed = name.split("-")
+        return style, int(seed)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.artworks
+
+    def names(self) -> List[str]:
+        """The batch and the newest `size` images, the ones to show"""
+        with self.lock:
+            shown = self.batch + self.entries[max(len(self.entries) - self.size, 0) :]
+            return [self.name(*entry) for entry in shown]
+
+    def get(self, name: str) -> Optional[Artwork]:
+        return self.artworks.get(name)
+
+    def start(self) -> None:
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def run(self) -> None:
+        if self.size <= 0:
+            return  # only the batch is shown
+        rotate = False
+        while True:
+            try:
+                with self.lock:
+                    missing = self.size - len(self.entries)
+                # Fill the pool first, then replace the oldest image each round
+                if missing > 0 or rotate:
+                    self.add(max(missing, 1))
+            except Exception:
+                # Keep rotating, the next round may well succeed
+                self.logger.exception("art pool: unable to add images")
+            self.wakeup.wait(self.refresh_seconds)
+            self.wakeup.clear()
+            rotate = True
+
+    def add(self, count: int = 1) -> List[str]:
+        """Generate count more images and drop the ones no longer needed"""
+        jobs = [
+            (self.random.choice(self.styles), self.random.randrange(self.SEED_LIMIT))
+            for _ in range(count)
+        ]
+        self.store.render_batch(jobs, self.workers)
+        with self.lock:
+            for entry in jobs:
+                if entry in self.entries:
+                    self.entries.remove(entry)
+                self.entries.append(entry)
+                self.__remember(*entry)
+            self.__trim()
+            self.version += 1
+        self.prune()
+        names = [self.name(*job) for job in jobs]
+        self.logger.info(f"art pool: added {', '.join(names)}")
+        return names
+
+    def prune(self) -> None:
+        """Delete the stored images that are no longer in the pool"""
+        with self.lock:
+            kept = set(self.entries) | set(self.batch)
+        for entry in self.store.entries():
+            if entry not in kept:
+                self.store.discard(*entry)
+
+    def __trim(self) -> None:
+        """Keep `size` images and the `size` replaced before them"""
+        drop = max(len(self.entries) - 2 * self.size, 0)
+        for entry in self.entries[:drop]:
+            del self.artworks[self.name(*entry)]
+        self.entries = self.entries[drop:]
+
+    def __remember(self, style: str, seed: int) -> None:
+        stat = os.stat(self.store.path(style, seed))
+        name = self.name(style, seed)
+        self.artworks[name] = Artwork(name, stat.st_size, stat.st_mtime)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate art for the slideshow, or print a Mondrian img tag"
+    )
+    parser.add_argument("--batch", type=int, default=0, help="images to render")
+    parser.add_argument(
+        "--styles",
+        default=",".join(STYLES),
+        help=f"comma separated styles to pick from ({', '.join(STYLES)})",
+    )
+    parser.add_argument("--folder", default=os.path.join("cache", "generated"))
+    parser.add_argument("--width", type=int, default=1024)
+    parser.add_argument("--height", type=int, default=600)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if not args.batch:
+        img_tag = f'<img src="{generate_mondrian()}" alt="Mondrian-style art">'
+        print(img_tag)
+        return
+
+    styles = [style.strip() for style in args.styles.split(",") if style.strip()]
+    unknown = [style for style in styles if style not in STYLES]
+    if unknown:
+        parser.error(f"unknown styles: {', '.join(unknown)}")
+
+    store = ArtStore(args.folder, args.width, args.height)
+    jobs = [
+        (random.choice(styles), random.randrange(ArtPool.SEED_LIMIT))
+        for _ in range(args.batch)
+    ]
+    store.render_batch(jobs, args.workers)
+    store.add_batch(jobs)
+    print(f"{len(store.batch())} pre-rendered images in {args.folder}", file=sys.stderr)
+
+
 if __name__ == "__main__":
-    img_tag = f'<img src="{generate_mondrian()}" alt="Mondrian-style art">'
-    print(img_tag)
+    main()
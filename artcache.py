@@ -0,0 +1,146 @@
+import os
+import re
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+
+IMAGE_MIMETYPES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+    (b"RIFF", "image/webp"),
+)
+
+
+def sniff_mimetype(path: str) -> str:
+    """Guess an image mimetype from the first bytes of the file"""
+    with open(path, "rb") as f:
+        head = f.read(12)
+    for magic, mimetype in IMAGE_MIMETYPES:
+        if head.startswith(magic):
+            return mimetype
+    return "application/octet-stream"
+
+
+class AlbumArtCache:
+    """
+    Size-bounded LRU cache of album art on disk.
+
+    Images are fetched once with the fetch callable and kept in folder until
+    the total size goes over max_bytes, then the least recently used files are
+    removed. Concurrent requests for the same key share a single fetch.
+    """
+
+    # A leading alphanumeric keeps "." and ".." out of the folder path
+    KEY_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+    def __init__(
+        self, folder: str, max_bytes: int, fetch: Callable[[str], Optional[bytes]]
+    ) -> None:
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.fetch = fetch
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, int]" = OrderedDict()
+        self.in_flight: Dict[str, threading.Event] = {}
+        self.total_bytes = 0
+        self.prefetcher = ThreadPoolExecutor(max_workers=1)
+        self.__load()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.folder, key)
+
+    def __contains__(self, key: str) -> bool:
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the path of the cached image, fetching it if needed"""
+        if not self.KEY_RE.match(key):
+            return None
+
+        with self.lock:
+            hit = key in self.entries
+            if hit:
+                self.entries.move_to_end(key)
+            else:
+                event = self.in_flight.get(key)
+                owner = event is None
+                if owner:
+                    event = self.in_flight[key] = threading.Event()
+
+        if hit:
+            # Keep the LRU order across restarts
+            try:
+                os.utime(self.path(key))
+            except OSError:
+                pass
+            return self.path(key)
+
+        if not owner:
+            event.wait()
+            with self.lock:
+                return self.path(key) if key in self.entries else None
+
+        try:
+            data = self.fetch(key)
+            if data:
+                self.__store(key, data)
+        except Exception:
+            self.logger.exception(f"Error fetching image {key}")
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            event.set()
+
+        with self.lock:
+            return self.path(key) if key in self.entries else None
+
+    def prefetch(self, keys: Iterable[str]) -> None:
+        """Fetch missing images in the background, in order"""
+        for key in keys:
+            if key not in self:
+                self.prefetcher.submit(self.get, key)
+
+    def __store(self, key: str, data: bytes) -> None:
+        # Created on the first image, not when the app starts
+        os.makedirs(self.folder, exist_ok=True)
+        tmp = self.path(key) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self.path(key))
+        with self.lock:
+            self.total_bytes += len(data) - self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            self.__evict()
+
+    def __evict(self) -> None:
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+            self.logger.debug(f"evicted {key}")
+
+    def __load(self) -> None:
+        """Pick up what a previous run left in the folder, oldest first"""
+        files = []
+        if not os.path.isdir(self.folder):
+            return
+        for entry in os.scandir(self.folder):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith(".tmp"):
+                os.remove(entry.path)
+                continue
+            stat = entry.stat()
+            files.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(files):
+            self.entries[name] = size
+            self.total_bytes += size
+        self.__evict()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the Mondrian renderer.
+
+Compares the RGB ImageDraw renderer art_generator used to have, which left
+Pillow to quantize every image to a palette when saving it as GIF, with the
+palette-native render_mondrian, for each output format at the landscape and
+portrait display sizes.
+
+    python benchmarks/bench_art.py
+"""
+
+import io
+import os
+import sys
+import random
+import timeit
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from art_generator import encode, render_mondrian  # noqa: E402
+
+SIZES = [(1024, 600), (600, 1024)]
+FORMATS = ["gif", "png", "webp"]
+
+
+def legacy_generate(width, height):
+    """The RGB renderer generate_mondrian used before render_mondrian."""
+    img = Image.new("RGB", (width, height), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    vertical_lines = sorted(
+        random.sample(range(100, width - 100), random.randint(3, 5))
+    )
+    horizontal_lines = sorted(
+        random.sample(range(100, height - 100), random.randint(2, 4))
+    )
+    vertical_lines = [0] + vertical_lines + [width]
+    horizontal_lines = [0] + horizontal_lines + [height]
+    palette = [(255, 255, 255), (237, 28, 36), (63, 72, 204), (255, 242, 0)]
+    weights = [0.6, 0.15, 0.15, 0.1]
+    for i in range(len(vertical_lines) - 1):
+        for j in range(len(horizontal_lines) - 1):
+            fill_color = random.choices(palette, weights=weights, k=1)[0]
+            draw.rectangle(
+                [
+                    vertical_lines[i],
+                    horizontal_lines[j],
+                    vertical_lines[i + 1],
+                    horizontal_lines[j + 1],
+                ],
+                fill=fill_color,
+            )
+    line_thickness = random.choice([4, 6, 8])
+    for x in vertical_lines:
+        draw.line([(x, 0), (x, height)], fill=(0, 0, 0), width=line_thickness)
+    for y in horizontal_lines:
+        draw.line([(0, y), (width, y)], fill=(0, 0, 0), width=line_thickness)
+    buffer = io.BytesIO()
+    img.save(buffer, format="GIF")
+    return buffer.getvalue()
+
+
+def rate(fn, number):
+    return number / timeit.timeit(fn, number=number)
+
+
+def main(number=50):
+    print("%-10s %-14s %10s %10s" % ("size", "renderer", "images/s", "bytes"))
+    for width, height in SIZES:
+        size = "%dx%d" % (width, height)
+        print(
+            "%-10s %-14s %10.1f %10d"
+            % (
+                size,
+                "legacy gif",
+                rate(lambda: legacy_generate(width, height), number),
+                len(legacy_generate(width, height)),
+            )
+        )
+        for format in FORMATS:
+            seeds = iter(range(number * 2))
+            print(
+                "%-10s %-14s %10.1f %10d"
+                % (
+                    size,
+                    "palette " + format,
+                    rate(
+                        lambda: encode(
+                            render_mondrian(width, height, next(seeds)), format
+                        ),
+                        number,
+                    ),
+                    len(encode(render_mondrian(width, height, 0), format)),
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of MOO/1 frame parsing.
+
+Compares the string based parsing RoonApiWebSocket.on_message used to do with
+roonapi.moomessage.MOOMessage over frames shaped like the ones a core sends:
+a zones_changed update for a house with many zones, a browse_load page of
+PAGE_SIZE items, and a short seek tick.
+
+    python benchmarks/bench_moo.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from roonapi.moomessage import MOOMessage, json  # noqa: E402
+
+
+def make_frame(name, request_id, body):
+    body = json.dumps(body).encode("utf-8")
+    header = (
+        "MOO/1 CONTINUE %s\nRequest-Id: %s\nContent-Length: %s\nContent-Type: application/json\n\n"
+        % (name, request_id, len(body))
+    )
+    return header.encode("ascii") + body
+
+
+def zone(i):
+    return {
+        "zone_id": "1601%012d" % i,
+        "display_name": "Zone %d" % i,
+        "state": "playing",
+        "outputs": [
+            {
+                "output_id": "1701%012d" % i,
+                "zone_id": "1601%012d" % i,
+                "display_name": "Output %d" % i,
+                "volume": {"type": "number", "min": 0, "max": 100, "value": 42},
+            }
+        ],
+        "now_playing": {
+            "seek_position": 12,
+            "length": 312,
+            "image_key": "c7b9c4f1d5b5e0b6a2e7%d" % i,
+            "three_line": {
+                "line1": "Track number %d" % i,
+                "line2": "Some Artist / Another Artist",
+                "line3": "An Album Title (Deluxe Édition)",
+            },
+        },
+    }
+
+
+FRAMES = {
+    "zones_changed x20": make_frame(
+        "Changed", 12, {"zones_changed": [zone(i) for i in range(20)]}
+    ),
+    "browse_load x100": make_frame(
+        "Success",
+        57,
+        {
+            "items": [
+                {
+                    "title": "Album %d" % i,
+                    "subtitle": "Artist %d" % i,
+                    "image_key": "b1%030d" % i,
+                    "item_key": "12:%d" % i,
+                    "hint": "list",
+                }
+                for i in range(100)
+            ],
+            "offset": 0,
+            "list": {"title": "Albums", "count": 40000, "level": 2},
+        },
+    ),
+    "zones_seek_changed": make_frame(
+        "Changed",
+        12,
+        {"zones_seek_changed": [{"zone_id": "1601", "seek_position": 13}]},
+    ),
+}
+
+
+def legacy_parse(message):
+    """The parsing RoonApiWebSocket.on_message did before MOOMessage."""
+    message = message.decode("utf-8")
+    lines = message.split("\n")
+    header = lines[0]
+    body = ""
+    request_id = None
+    line_with_request_id = [line for line in lines if line.startswith("Request-Id")]
+    if line_with_request_id:
+        request_id = int(line_with_request_id[0].split("Request-Id: ")[1])
+    if "Content-Type:" in message:
+        body = "".join(message.split("\n\n")[1:])
+    elif "Logging:" not in message:
+        body = header
+    if body and "{" in body:
+        body = json.loads(body)
+    return header, request_id, body
+
+
+def moo_parse(message):
+    moo = MOOMessage(message)
+    return moo.first_line, moo.request_id, moo.content
+
+
+def best(funcs, number, repeat=15):
+    """
+    Seconds for number calls of each of funcs, the best of repeat runs.
+
+    The runs take turns, so a busy spell on the machine hits both sides.
+    """
+    times = [[] for _ in funcs]
+    for _ in range(repeat):
+        for func, runs in zip(funcs, times):
+            runs.append(timeit.timeit(func, number=number))
+    return [min(runs) for runs in times]
+
+
+def main(number=1000):
+    print("%-20s %8s %12s %12s %8s" % ("frame", "bytes", "legacy us", "moo us", "gain"))
+    for label, frame in FRAMES.items():
+        assert legacy_parse(frame) == moo_parse(frame)
+        legacy, moo = best(
+            [lambda: legacy_parse(frame), lambda: moo_parse(frame)], number
+        )
+        print(
+            "%-20s %8d %12.1f %12.1f %7.0f%%"
+            % (
+                label,
+                len(frame),
+                legacy / number * 1e6,
+                moo / number * 1e6,
+                (legacy - moo) / legacy * 100,
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+import os
+import glob
+import ctypes
+import logging
+import threading
+import subprocess
+from abc import ABC, abstractmethod
+from ctypes.util import find_library
+from datetime import datetime, time, timedelta, tzinfo
+from typing import Any, Callable, Optional
+
+
+class DisplayBackend(ABC):
+    """Switches the display power, set_power raises OSError on failure"""
+
+    name = "noop"
+
+    @abstractmethod
+    def set_power(self, on: bool) -> None:
+        pass
+
+
+class NoopDisplay(DisplayBackend):
+    """Leaves the display alone and remembers what it was asked, for tests"""
+
+    name = "noop"
+
+    def __init__(self) -> None:
+        self.is_on: Optional[bool] = None
+
+    def set_power(self, on: bool) -> None:
+        self.is_on = on
+
+
+class XsetDisplay(DisplayBackend):
+    """Forks xset, the fallback when nothing in-process is available"""
+
+    name = "xset"
+
+    def set_power(self, on: bool) -> None:
+        try:
+            subprocess.check_output(
+                ["xset", "dpms", "force", "on" if on else "off"],
+                stderr=subprocess.STDOUT,
+            )
+        except subprocess.CalledProcessError as e:
+            raise OSError(f"xset failed: {e.output.decode(errors='replace')}")
+
+
+XErrorHandler = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p)
+XIOErrorHandler = ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p)
+XIOErrorExitHandler = ctypes.CFUNCTYPE(None, ctypes.c_void_p, ctypes.c_void_p)
+
+
+class X11Display(DisplayBackend):
+    """
+    DPMS through libX11/libXext with ctypes.
+
+    The X server is started after the frame and restarted with the kiosk, so
+    every set_power opens its own connection and closes it again. Xlib's
+    default error handlers exit the process, they are replaced by ones that
+    log and let set_power raise OSError instead.
+    """
+
+    name = "x11"
+    DPMS_MODE_ON = 0
+    DPMS_MODE_OFF = 3
+
+    def __init__(self, display: Optional[str] = None) -> None:
+        libx11 = find_library("X11")
+        libxext = find_library("Xext")
+        if not libx11 or not libxext:
+            raise OSError("libX11 or libXext not found")
+        self.x11 = ctypes.CDLL(libx11)
+        self.xext = ctypes.CDLL(libxext)
+        self.x11.XOpenDisplay.argtypes = [ctypes.c_char_p]
+        self.x11.XOpenDisplay.restype = ctypes.c_void_p
+        self.x11.XCloseDisplay.argtypes = [ctypes.c_void_p]
+        self.x11.XSync.argtypes = [ctypes.c_void_p, ctypes.c_int]
+        for function in ("DPMSCapable", "DPMSEnable"):
+            getattr(self.xext, function).argtypes = [ctypes.c_void_p]
+        self.xext.DPMSForceLevel.argtypes = [ctypes.c_void_p, ctypes.c_ushort]
+        self.display_name = display
+        self.logger = logging.getLogger(__name__)
+        self.failed = False
+
+        # Kept referenced, Xlib holds on to the C pointers
+        self.error_handler = XErrorHandler(self.on_error)
+        self.io_error_handler = XIOErrorHandler(self.on_io_error)
+        self.io_error_exit_handler = XIOErrorExitHandler(self.on_io_error_exit)
+        self.x11.XSetErrorHandler.argtypes = [XErrorHandler]
+        self.x11.XSetErrorHandler(self.error_handler)
+        self.x11.XSetIOErrorHandler.argtypes = [XIOErrorHandler]
+        self.x11.XSetIOErrorHandler(self.io_error_handler)
+        # libX11 1.7+, without it a lost connection still ends in exit()
+        self.set_exit_handler = getattr(self.x11, "XSetIOErrorExitHandler", None)
+        if self.set_exit_handler is not None:
+            self.set_exit_handler.argtypes = [
+                ctypes.c_void_p,
+                XIOErrorExitHandler,
+                ctypes.c_void_p,
+            ]
+
+    def on_error(self, display, event) -> int:
+        self.failed = True
+        self.logger.warning("display: X error")
+        return 0
+
+    def on_io_error(self, display) -> int:
+        self.failed = True
+        self.logger.warning("display: lost the connection to X")
+        return 0
+
+    def on_io_error_exit(self, display, user_data) -> None:
+        # Returning instead of exiting leaves the connection unusable, it is
+        # closed at the end of set_power
+        self.failed = True
+
+    def set_power(self, on: bool) -> None:
+        name = self.display_name or os.getenv("DISPLAY", ":0")
+        display = self.x11.XOpenDisplay(name.encode())
+        if not display:
+            raise OSError(f"Unable to open X display {name}")
+        self.failed = False
+        try:
+            if self.set_exit_handler is not None:
+                self.set_exit_handler(display, self.io_error_exit_handler, None)
+            if not self.xext.DPMSCapable(display):
+                raise OSError(f"X display {name} does not support DPMS")
+            # Like xset, make sure DPMS is enabled before forcing a level
+            self.xext.DPMSEnable(display)
+            level = self.DPMS_MODE_ON if on else self.DPMS_MODE_OFF
+            if not self.xext.DPMSForceLevel(display, level):
+                raise OSError("DPMSForceLevel failed")
+            self.x11.XSync(display, 0)
+            if self.failed:
+                raise OSError(f"X display {name} failed")
+        finally:
+            self.x11.XCloseDisplay(display)
+
+
+class AutoDisplay(DisplayBackend):
+    """
+    X11 DPMS in-process, forking xset when libXext is missing or the X11
+    call fails. X11 is tried again on every call, X may not be up yet.
+    """
+
+    name = "on"
+
+    def __init__(self) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.xset = XsetDisplay()
+        try:
+            self.x11: Optional[X11Display] = X11Display()
+        except OSError as e:
+            self.logger.warning(f"display: {e}, falling back to xset")
+            self.x11 = None
+
+    def set_power(self, on: bool) -> None:
+        if self.x11 is not None:
+            try:
+                self.x11.set_power(on)
+                return
+            except OSError as e:
+                self.logger.warning(f"display: {e}, falling back to xset")
+        self.xset.set_power(on)
+
+
+class BacklightDisplay(DisplayBackend):
+    """Powers the panel through /sys/class/backlight/*/bl_power"""
+
+    name = "backlight"
+    FB_BLANK_UNBLANK = 0
+    FB_BLANK_POWERDOWN = 4
+
+    def __init__(self, root: str = "/sys/class/backlight") -> None:
+        devices = sorted(glob.glob(os.path.join(root, "*", "bl_power")))
+        if not devices:
+            raise OSError(f"No backlight found in {root}")
+        self.path = devices[0]
+
+    def set_power(self, on: bool) -> None:
+        with open(self.path, "w") as f:
+            f.write(str(self.FB_BLANK_UNBLANK if on else self.FB_BLANK_POWERDOWN))
+
+
+DISPLAY_BACKENDS = {
+    "on": AutoDisplay,
+    "off": NoopDisplay,
+    "noop": NoopDisplay,
+    "xset": XsetDisplay,
+    "x11": X11Display,
+    "backlight": BacklightDisplay,
+}
+
+
+def create_backend(control: str) -> DisplayBackend:
+    """The backend for a DISPLAY_CONTROL value, nothing connects to X yet"""
+    if control not in DISPLAY_BACKENDS:
+        raise ValueError(f"Unknown DISPLAY_CONTROL {control}")
+    return DISPLAY_BACKENDS[control]()
+
+
+def is_screen_on(current_hour, on_hour, off_hour):
+    if on_hour == off_hour:
+        return False  # Device should be off if on and off hours are the same
+    if on_hour < off_hour:
+        return on_hour <= current_hour < off_hour  # Normal range
+    else:
+        return not (off_hour <= current_hour < on_hour)  # Overnight case
+
+
+def next_transition(now: datetime, on_hour: int, off_hour: int) -> Optional[datetime]:
+    """
+    The next time after now, in the time zone of now, at which the display
+    schedule switches on or off. None if it never does.
+    """
+    if on_hour == off_hour:
+        return None
+    candidates = []
+    for days in (0, 1):
+        day = (now + timedelta(days=days)).date()
+        for hour in (on_hour, off_hour):
+            at = datetime.combine(day, time(hour), tzinfo=now.tzinfo)
+            if at > now:
+                candidates.append(at)
+    return min(candidates)
+
+
+class DisplayManager:
+    """
+    Keeps the display power in line with the schedule and playback.
+
+    The display is on during the configured hours and whenever Roon is
+    playing or loading. The current state is remembered so switch is only
+    called on a real change. A background task sleeps until the next on/off
+    hour, and playback changes are applied as soon as they are reported.
+    """
+
+    PLAYING_STATES = ("playing", "loading")
+    RETRY_SECONDS = 60
+
+    def __init__(
+        self,
+        switch: Callable[[bool], None],
+        on_hour: int,
+        off_hour: int,
+        tz: tzinfo,
+        now: Callable[[], datetime] = datetime.now,
+    ) -> None:
+        self.switch = switch
+        self.on_hour = on_hour
+        self.off_hour = off_hour
+        self.tz = tz
+        self.now = now
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.running = False
+        self.task = None
+        self.playing = False
+        self.is_on: Optional[bool] = None
+        self.switches = 0
+
+    def start(self, start_background_task: Callable[..., Any]) -> None:
+        if self.running:
+            return
+        self.running = True
+        self.task = start_background_task(self.run)
+
+    def stop(self) -> None:
+        self.running = False
+        self.wakeup.set()
+
+    def set_playback(self, state: Optional[str]) -> None:
+        """Called with the zone state on every album update"""
+        playing = state in self.PLAYING_STATES
+        if playing != self.playing:
+            self.playing = playing
+            self.update()
+
+    def scheduled_on(self) -> bool:
+        hour = self.now().astimezone(self.tz).hour
+        return is_screen_on(hour, self.on_hour, self.off_hour)
+
+    def update(self) -> None:
+        turn_on = self.playing or self.scheduled_on()
+        with self.lock:
+            if turn_on == self.is_on:
+                return
+            try:
+                self.switch(turn_on)
+            except Exception:
+                # Leave the state unknown so the next update tries again
+                self.logger.exception("Unable to switch the display")
+                self.is_on = None
+                return
+            self.is_on = turn_on
+            self.switches += 1
+        self.logger.info(f"display: {'on' if turn_on else 'off'}")
+
+    def run(self) -> None:
+        while self.running:
+            self.update()
+            at = next_transition(
+                self.now().astimezone(self.tz), self.on_hour, self.off_hour
+            )
+            if at is None:
+                seconds = None
+            else:
+                # Timestamps, as same-zone datetime arithmetic ignores DST
+                seconds = at.timestamp() - self.now().timestamp()
+                self.logger.info(f"display: next transition at {at}")
+                # Wake just after the hour so the schedule has switched
+                seconds = max(seconds, 0) + 1
+            if self.is_on is None:
+                # The switch failed, eg X isn't up yet, try again soon
+                seconds = min(seconds or self.RETRY_SECONDS, self.RETRY_SECONDS)
+            self.wakeup.wait(seconds)
+            self.wakeup.clear()
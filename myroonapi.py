@@ -1,10 +1,12 @@
 import os
+import json
 import time
-import asyncio
+import urllib.request
 import logging
-from typing import Optional, Callable, Dict, Any
+from typing import Optional, Callable, Dict, Any, List, Tuple
 
 from roonapi import RoonApi, RoonDiscovery
+from artcache import AlbumArtCache
 
 
 class MyRoonApi:
@@ -13,6 +15,9 @@ class MyRoonApi:
         "data:image/gif;base64,R0lGODdhAQABAIABAAAAAAAAACwAAAAAAQABAAACAkwBADs="
     )
 
+    # Fields the browser renders, other changes are not worth a push
+    NOTIFY_FIELDS = ("state", "artist", "title", "track", "image_key")
+
     def __init__(self) -> None:
         self.zone_name = os.environ.get("ROON_ZONE", None)
         self.core_id_fname = os.environ.get("ROON_CORE_ID_FNAME", "roon_core_id.txt")
@@ -22,7 +27,21 @@ class MyRoonApi:
         self.logger = logging.getLogger(__name__)
         self.image_size = int(os.environ.get("IMAGE_SIZE", 600))
         self.connected = False
+        self.roonapi = None
+        cache_folder = os.environ.get("CACHE_FOLDER", "cache")
+        self.state_fname = os.environ.get(
+            "ROON_STATE_FNAME", os.path.join(cache_folder, "roon_state.json")
+        )
+        self.saved_state = self.__load_state()
+        self.art_cache = AlbumArtCache(
+            os.path.join(cache_folder, "art", str(self.image_size)),
+            int(os.environ.get("ART_CACHE_MB", 64)) * 1024 * 1024,
+            self.__fetch_art,
+        )
+        self.prefetch_count = int(os.environ.get("QUEUE_PREFETCH", 3))
+        self.queue_items: List[Dict[str, Any]] = []
         self.last_state = "unknown"
+        self.last_notified: Optional[Dict[str, Any]] = None
 
         if not bool(os.environ.get("NAME", "")):
             raise Exception(
@@ -47,9 +66,7 @@ class MyRoonApi:
         return True
 
     def register(self) -> None:
-        discover = RoonDiscovery(None)
-        server = discover.first()
-        discover.stop()
+        server = self.__discover(None)
 
         self.logger.info("Found the following server")
         self.logger.info(server)
@@ -94,64 +111,121 @@ class MyRoonApi:
                 token = f.read()
 
             self.logger.info(core_id)
-            discover = RoonDiscovery(core_id)
-            server = discover.first()
-            discover.stop()
+            self.roonapi = self.__connect_cached(core_id, token)
+            if self.roonapi is None:
+                server = self.__discover(core_id)
+                if server[0] is None:
+                    self.logger.error("No server found")
+                    return False
 
-            if server[0] is None:
-                self.logger.error("No server found")
-                return False
-
-            self.logger.info(server)
-            self.roonapi = RoonApi(self.appinfo, token, server[0], server[1], False)
+                self.logger.info(server)
+                self.roonapi = RoonApi(self.appinfo, token, server[0], server[1], False)
             self.notify_clients = notify_clients
 
+            # Until the core sends the zones, the zone id comes from last run
             album = self.get_zone_data()
+            zone_id = (album or {}).get("zone_id") or self.saved_state.get("zone_id")
+            if zone_id is None:
+                self.logger.error(f"Zone {self.zone_name} not found")
+                return False
 
-            self.roonapi.register_queue_callback(
-                self.__queue_callback, album["zone_id"]
+            self.roonapi.register_queue_callback(self.__queue_callback, zone_id)
+            self.roonapi.register_state_callback(
+                self.__state_callback,
+                event_filter="zones_changed",
+                id_filter=zone_id,
+            )
+            self.__save_state(
+                core_id=core_id,
+                host=self.roonapi.host,
+                port=self.roonapi.port,
+                zone_name=self.zone_name,
+                zone_id=zone_id,
             )
-            self.roonapi.register_state_callback(self.__state_callback)
             self.connected = True
             return True
         except OSError:
             self.logger.error("Exception connecting to Roon")
             return False
 
+    def __discover(self, core_id: Optional[str]) -> Tuple[Optional[str], Any]:
+        """The host and port of the core, (None, None) if none answers"""
+        discover = RoonDiscovery(core_id)
+        server = discover.first()
+        discover.stop()
+        return server
+
+    def __connect_cached(self, core_id: str, token: str) -> Optional[RoonApi]:
+        """Connect to the core where it was last run, skipping discovery"""
+        state = self.saved_state
+        if state.get("core_id") != core_id or not state.get("host"):
+            return None
+        self.logger.info(f"Connecting to {state['host']}:{state['port']}")
+        roonapi = None
+        try:
+            roonapi = RoonApi(self.appinfo, token, state["host"], state["port"], False)
+            if roonapi.core_id == core_id:
+                return roonapi
+            self.logger.warning("A different core answered, discovering")
+        except Exception as e:
+            self.logger.warning(f"Cached core not reachable ({e}), discovering")
+        if roonapi is not None:
+            roonapi.stop()
+        return None
+
+    def cached_zone_data(self) -> Optional[Dict[str, Any]]:
+        """The zone data saved by the last run, to show until Roon answers"""
+        if self.saved_state.get("zone_name") != self.zone_name:
+            return None
+        return self.saved_state.get("album")
+
     def is_connected(self) -> bool:
         return self.connected
 
     def get_zone_data(self, show_zones=False) -> Optional[str]:
         roonapi = self.__get_roonapi()
-        for zone_id, zone_info in roonapi.zones.items():
-            print("- " + zone_info["display_name"])
-            if zone_info["display_name"] == self.zone_name:
-                zone = roonapi.zones[zone_id]
-                self.last_state = zone["state"]
-                # pprint(zone )
-                data = {
-                    "state": zone["state"],
-                    "zone_id": zone_id,
-                    "url": self.BLACK_PIXEL,
-                    "artist": "",
-                    "title": "",
-                    "track": "",
-                }
-                if "now_playing" in zone:
-                    data.update(self.__get_album_data(zone["now_playing"]))
-                return data
-        return None
+        if show_zones:
+            for zone_info in roonapi.zones.values():
+                print("- " + zone_info["display_name"])
+        zone = roonapi.zone_by_name(self.zone_name)
+        if zone is None:
+            # No live data yet, keep showing what was there before a restart
+            return None if roonapi.zones else self.cached_zone_data()
+        self.last_state = zone["state"]
+        data = {
+            "state": zone["state"],
+            "zone_id": zone["zone_id"],
+            "url": self.BLACK_PIXEL,
+            "artist": "",
+            "title": "",
+            "track": "",
+        }
+        if "now_playing" in zone:
+            data.update(self.__get_album_data(zone["now_playing"]))
+        return data
+
+    def get_art(self, image_key: str) -> Optional[str]:
+        """Path of the locally cached album art, fetched from the core on a miss"""
+        return self.art_cache.get(image_key)
+
+    def __fetch_art(self, image_key: str) -> Optional[bytes]:
+        roonapi = self.__get_roonapi()
+        url = roonapi.get_image(
+            image_key, width=self.image_size, height=self.image_size
+        )
+        with urllib.request.urlopen(url, timeout=10) as response:
+            return response.read()
 
     def __get_album_data(self, now_playing) -> Dict[str, Any]:
+        image_key = now_playing.get("image_key")
         return {
             "state": self.last_state,
             "image_size": self.image_size,
             "artist": now_playing["three_line"]["line2"],
             "title": now_playing["three_line"]["line3"],
             "track": now_playing["three_line"]["line1"],
-            "url": self.roonapi.get_image(
-                now_playing["image_key"], width=self.image_size, height=self.image_size
-            ),
+            "image_key": image_key,
+            "url": f"/art/{image_key}" if image_key else self.BLACK_PIXEL,
         }
 
     def __save_credentials(self, core_id: str, token: str) -> None:
@@ -162,27 +236,74 @@ class MyRoonApi:
 
     def __state_callback(self, event: str, changed_items: Any) -> None:
         if event == "zones_changed":
-            data = self.get_zone_data()
-            if self.notify_clients:
-                asyncio.run(self.notify_clients(data))
+            self.__notify_if_changed(self.get_zone_data())
+
+    def __notify_if_changed(self, data: Optional[Dict[str, Any]]) -> None:
+        if data is None or not self.notify_clients:
+            return
+        last = self.last_notified or {}
+        if all(data.get(f) == last.get(f) for f in self.NOTIFY_FIELDS):
+            self.logger.debug("zone update without visible changes, not notifying")
+            return
+        self.last_notified = data
+        self.notify_clients(data)
+        self.__save_state(zone_name=self.zone_name, album=data)
+
+    def __load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_fname) as f:
+                state = json.load(f)
+            return state if isinstance(state, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            self.logger.warning(f"Ignoring unreadable {self.state_fname}")
+            return {}
+
+    def __save_state(self, **changes: Any) -> None:
+        """Remember where the core and zone were, for a fast start next time"""
+        self.saved_state.update(changes)
+        tmp = self.state_fname + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.state_fname) or ".", exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump(self.saved_state, f)
+            os.replace(tmp, self.state_fname)
+        except OSError:
+            self.logger.warning(f"Unable to save {self.state_fname}")
 
     def __get_roonapi(self) -> RoonApi:
         if self.roonapi is None:
             raise Exception("RoonApi not initialized")
         return self.roonapi
 
-    def __extract_album(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        if "items" in data and len(data["items"]) > 0:
-            return data["items"][0]
-        elif "changes" in data and len(data["changes"]) > 0:
-            for change in data["changes"]:
-                if change["operation"] == "insert":
-                    return change["items"][0]
-        return None
+    def __update_queue(self, data: Dict[str, Any]) -> None:
+        """Apply a queue subscription message to our copy of the queue"""
+
+        def slim(item: Dict[str, Any]) -> Dict[str, Any]:
+            return {
+                "image_key": item.get("image_key"),
+                "three_line": item["three_line"],
+            }
+
+        if "items" in data:
+            self.queue_items = [slim(item) for item in data["items"]]
+        for change in data.get("changes", []):
+            index = change.get("index", 0)
+            if change["operation"] == "remove":
+                del self.queue_items[index : index + change.get("count", 1)]
+            elif change["operation"] == "insert":
+                self.queue_items[index:index] = [slim(i) for i in change["items"]]
+
+    def __prefetch_art(self) -> None:
+        """Get the art of the next tracks into the cache before they play"""
+        upcoming = self.queue_items[: self.prefetch_count + 1]
+        keys = [item["image_key"] for item in upcoming if item["image_key"]]
+        self.art_cache.prefetch(keys)
 
     def __queue_callback(self, data: Dict[str, Any]) -> None:
         self.logger.info("queue_callback")
-        album = self.__extract_album(data)
-        if album and self.notify_clients:
-            evdata = self.__get_album_data(album)
-            asyncio.run(self.notify_clients(evdata))
+        self.__update_queue(data)
+        self.__prefetch_art()
+        if self.queue_items:
+            self.__notify_if_changed(self.__get_album_data(self.queue_items[0]))
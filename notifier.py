@@ -0,0 +1,96 @@
+import time
+import queue
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict
+
+
+class NotificationDispatcher:
+    """
+    Deliver events to the browsers from one long-lived background task.
+
+    post() never blocks, so it can be called from the Roon websocket thread.
+    Events that pile up while a delivery is running are coalesced: only the
+    latest message for each event name is sent.
+    """
+
+    def __init__(
+        self, deliver: Callable[[str, Dict[str, Any]], None], maxsize: int = 64
+    ) -> None:
+        self.deliver = deliver
+        self.queue: queue.Queue = queue.Queue(maxsize)
+        self.logger = logging.getLogger(__name__)
+        self.running = False
+        self.task = None
+        self.dispatched = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+
+    def start(self, start_background_task: Callable[..., Any]) -> None:
+        if self.running:
+            return
+        self.running = True
+        self.task = start_background_task(self.run)
+
+    def stop(self) -> None:
+        self.running = False
+
+    def post(self, event: str, message: Dict[str, Any]) -> None:
+        item = (time.monotonic(), event, message)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            # Drop the oldest event, the newest one is what clients need to see
+            try:
+                self.queue.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(item)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue.qsize(),
+            "dispatched": self.dispatched,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "last_latency_ms": round(self.last_latency * 1000, 1),
+            "max_latency_ms": round(self.max_latency * 1000, 1),
+        }
+
+    def run(self) -> None:
+        while self.running:
+            try:
+                batch = [self.queue.get(timeout=1)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.dispatch(batch)
+
+    def dispatch(self, batch) -> None:
+        latest: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        for _, event, message in batch:
+            latest.pop(event, None)
+            latest[event] = message
+        self.coalesced += len(batch) - len(latest)
+
+        for event, message in latest.items():
+            try:
+                self.deliver(event, message)
+            except Exception:
+                self.logger.exception(f"Error delivering {event}")
+            self.dispatched += 1
+
+        self.last_latency = time.monotonic() - batch[0][0]
+        self.max_latency = max(self.max_latency, self.last_latency)
+        self.logger.info(
+            f"dispatched {len(latest)} of {len(batch)} events, "
+            f"queue depth {self.queue.qsize()}, "
+            f"latency {self.last_latency * 1000:.1f} ms"
+        )
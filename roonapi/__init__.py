@@ -1,4 +1,10 @@
 # flake8: noqa
 from .constants import LOGGER
-from .roonapi import RoonApi, split_media_path
+from .roonapi import (
+    RoonApi,
+    RoonApiException,
+    RoonApiTimeoutException,
+    split_media_path,
+)
 from .discovery import RoonDiscovery
+from .asyncroonapi import AsyncRoonApi, AsyncRoonSubscription
@@ -0,0 +1,357 @@
+"""
+Asyncio client for the roon api.
+
+AsyncRoonApi speaks the same MOO/1 protocol as RoonApi but runs entirely on
+one event loop on top of the websockets package: requests are awaitable,
+subscriptions are async iterators and reconnection happens inside the loop,
+so no extra threads are started.
+
+    api = AsyncRoonApi(appinfo, token, host, port)
+    await api.start()
+    zones = await api.request(SERVICE_TRANSPORT + "/get_zones")
+    async for message in api.subscribe_zones():
+        ...
+"""
+
+import asyncio
+
+from websockets.asyncio.client import connect
+from websockets.exceptions import WebSocketException
+
+from .constants import (
+    LOGGER,
+    REGISTERED,
+    SERVICE_BROWSE,
+    SERVICE_PING,
+    SERVICE_REGISTRY,
+    SERVICE_TRANSPORT,
+)
+from .moomessage import MOOMessage
+from .roonapi import RoonApiException, RoonApiTimeoutException
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+
+def _encode(verb, name, request_id, body=None):
+    """Build a binary MOO/1 frame."""
+    msg = "MOO/1 %s %s\nRequest-Id: %s" % (verb, name, request_id)
+    if body is None:
+        msg += "\n\n"
+    else:
+        body = json.dumps(body)
+        msg += "\nContent-Length: %s\nContent-Type: application/json\n\n%s" % (
+            len(body),
+            body,
+        )
+    return msg.encode("utf-8")
+
+
+class AsyncRoonSubscription:
+    """Async iterator yielding the messages of one roon subscription."""
+
+    def __init__(self, api, service, endpoint, opt_data=None, maxsize=100):
+        """Create the subscription, it is sent once the api is registered."""
+        self._api = api
+        self.service = service
+        self.endpoint = endpoint
+        self.opt_data = opt_data
+        self.request_id = None
+        self.subkey = None
+        self._queue = asyncio.Queue(maxsize)
+        self._closed = False
+
+    def __aiter__(self):
+        """Return self, subscriptions are their own iterators."""
+        return self
+
+    async def __anext__(self):
+        """Wait for the next message of the subscription."""
+        if self._closed and self._queue.empty():
+            raise StopAsyncIteration
+        message = await self._queue.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    def _put(self, message):
+        """Queue a message, dropping the oldest one if the reader falls behind."""
+        if self._queue.full():
+            self._queue.get_nowait()
+            LOGGER.debug("Dropping message for slow %s subscriber", self.endpoint)
+        self._queue.put_nowait(message)
+
+    async def close(self):
+        """Unsubscribe and end the iteration."""
+        if self._closed:
+            return
+        self._closed = True
+        await self._api._unsubscribe(self)
+        self._put(None)
+
+
+class AsyncRoonApi:  # pylint: disable=too-many-instance-attributes
+    """Asyncio version of RoonApi for use on a single event loop."""
+
+    def __init__(
+        self,
+        appinfo,
+        token,
+        host,
+        port,
+        request_timeout=2.5,
+        reconnect_delay=20,
+    ):
+        """
+        Set up the client, call start() to connect.
+
+        appinfo: a dict of the required information about the app that should be connected to the api
+        token: the token from a previous registration, or None
+        host: the ip or hostname of the Roon server,
+        port: the http port of the Roon websockets api.
+        request_timeout: maximum time in seconds to wait for the answer to a request
+        reconnect_delay: seconds to wait before reconnecting after the connection is lost
+        """
+        if not appinfo or not isinstance(appinfo, dict):
+            raise RoonApiException("Appinfo missing or in incorrect format")
+        if not (host and port):
+            raise RoonApiException("Host and port of the roon core must be specified!")
+
+        self._appinfo = appinfo
+        self._token = token
+        self._host = host
+        self._port = port
+        self._core_id = None
+        self._core_name = None
+        self._request_timeout = request_timeout
+        self._reconnect_delay = reconnect_delay
+
+        self._websocket = None
+        self._task = None
+        self._exit = False
+        self._ready = asyncio.Event()
+        self._requestid = 10
+        self._pending = {}
+        self._subscriptions = {}
+        self._subkey = 0
+
+    @property
+    def token(self):
+        """Return the authentication key from the registration with Roon."""
+        return self._token
+
+    @property
+    def host(self):
+        """Return the roon host."""
+        return self._host
+
+    @property
+    def core_id(self):
+        """Return the roon core id."""
+        return self._core_id
+
+    @property
+    def core_name(self):
+        """Return the roon core name."""
+        return self._core_name
+
+    @property
+    def ready(self):
+        """Whether the connection is open and registered."""
+        return self._ready.is_set()
+
+    async def start(self, timeout=None):
+        """Start the connection task and wait until registered with the core."""
+        if self._task is None:
+            self._exit = False
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        await asyncio.wait_for(self._ready.wait(), timeout)
+
+    async def stop(self):
+        """Close the connection and stop reconnecting."""
+        self._exit = True
+        for subscription in list(self._subscriptions.values()):
+            subscription._closed = True
+            subscription._put(None)
+        self._subscriptions = {}
+        if self._websocket is not None:
+            await self._websocket.close()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def __aenter__(self):
+        """Connect on entry."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, exc_tb):
+        """Disconnect on exit."""
+        await self.stop()
+
+    async def request(self, command, data=None, timeout=None):
+        """Send a request and wait for its result, for timeout seconds in all."""
+        if timeout is None:
+            timeout = self._request_timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        request_id = None
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+            request_id = self._next_request_id()
+            future = loop.create_future()
+            self._pending[request_id] = future
+            await self._websocket.send(_encode("REQUEST", command, request_id, data))
+            return await asyncio.wait_for(future, max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError as exc:
+            raise RoonApiTimeoutException(
+                "No reply to %s within %ss" % (command, timeout)
+            ) from exc
+        finally:
+            self._pending.pop(request_id, None)
+
+    def subscribe(self, service, endpoint, opt_data=None):
+        """Subscribe to events, returns an async iterator over the messages."""
+        subscription = AsyncRoonSubscription(self, service, endpoint, opt_data)
+        self._subscriptions[id(subscription)] = subscription
+        if self.ready:
+            asyncio.get_running_loop().create_task(self._send_subscribe(subscription))
+        return subscription
+
+    def subscribe_zones(self):
+        """Async iterator over zone change messages."""
+        return self.subscribe(SERVICE_TRANSPORT, "zones")
+
+    def subscribe_outputs(self):
+        """Async iterator over output change messages."""
+        return self.subscribe(SERVICE_TRANSPORT, "outputs")
+
+    def subscribe_queue(self, zone_or_output_id):
+        """Async iterator over queue change messages for a zone or output."""
+        return self.subscribe(
+            SERVICE_TRANSPORT, "queue", {"zone_or_output_id": zone_or_output_id}
+        )
+
+    # private methods
+    def _next_request_id(self):
+        request_id = self._requestid
+        self._requestid += 1
+        return request_id
+
+    async def _send_subscribe(self, subscription):
+        subscription.request_id = self._next_request_id()
+        subscription.subkey = self._subkey
+        self._subkey += 1
+        data = {"subscription_key": subscription.subkey}
+        if subscription.opt_data:
+            data.update(subscription.opt_data)
+        await self._websocket.send(
+            _encode(
+                "REQUEST",
+                "%s/subscribe_%s" % (subscription.service, subscription.endpoint),
+                subscription.request_id,
+                data,
+            )
+        )
+
+    async def _unsubscribe(self, subscription):
+        self._subscriptions.pop(id(subscription), None)
+        if not self.ready or subscription.request_id is None:
+            return
+        await self._websocket.send(
+            _encode(
+                "REQUEST",
+                "%s/unsubscribe_%s" % (subscription.service, subscription.endpoint),
+                self._next_request_id(),
+                {"subscription_key": subscription.subkey},
+            )
+        )
+
+    async def _run(self):
+        """Connect, register and read messages, reconnecting until stopped."""
+        ws_address = "ws://%s:%s/api" % (self._host, self._port)
+        while not self._exit:
+            try:
+                async with connect(ws_address, ping_interval=10) as websocket:
+                    self._websocket = websocket
+                    LOGGER.debug("Opened Websocket connection to the server...")
+                    await self._register()
+                    async for message in websocket:
+                        await self._on_message(message)
+            except (OSError, WebSocketException) as exc:
+                # Includes handshake errors, eg the core answering with a 503
+                LOGGER.debug("connection error %s", exc)
+            except Exception:  # pylint: disable=broad-except
+                LOGGER.exception("Unexpected error on the roon connection")
+            finally:
+                self._on_close()
+            if not self._exit:
+                LOGGER.warning(
+                    "Socket connection lost! Will try to reconnect in %ss",
+                    self._reconnect_delay,
+                )
+                await asyncio.sleep(self._reconnect_delay)
+
+    async def _register(self):
+        appinfo = self._appinfo.copy()
+        appinfo["required_services"] = [SERVICE_TRANSPORT, SERVICE_BROWSE]
+        appinfo["provided_services"] = []
+        if self._token:
+            appinfo["token"] = self._token
+        else:
+            LOGGER.info("The application should be approved within Roon's settings.")
+        await self._websocket.send(
+            _encode(
+                "REQUEST",
+                SERVICE_REGISTRY + "/register",
+                self._next_request_id(),
+                appinfo,
+            )
+        )
+
+    async def _on_registered(self, reginfo):
+        LOGGER.debug("Registered to Roon server %s", reginfo["display_name"])
+        self._token = reginfo["token"]
+        self._core_id = reginfo["core_id"]
+        self._core_name = reginfo["display_name"]
+        for subscription in list(self._subscriptions.values()):
+            await self._send_subscribe(subscription)
+        self._ready.set()
+
+    async def _on_message(self, message):
+        try:
+            moo = MOOMessage(message)
+            header, request_id, body = moo.first_line, moo.request_id, moo.content
+            if SERVICE_PING in header:
+                await self._websocket.send(_encode("COMPLETE", "Success", request_id))
+            elif REGISTERED in header:
+                await self._on_registered(body)
+            elif request_id in self._pending:
+                future = self._pending.pop(request_id)
+                if not future.done():
+                    future.set_result(body)
+            else:
+                for subscription in self._subscriptions.values():
+                    if subscription.request_id == request_id:
+                        subscription._put(body)
+                        break
+        except Exception:  # pylint: disable=broad-except
+            LOGGER.exception("Error while parsing message '%s'", message)
+
+    def _on_close(self):
+        self._ready.clear()
+        self._websocket = None
+        self._requestid = 10
+        self._subkey = 0
+        for subscription in self._subscriptions.values():
+            subscription.request_id = None
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(RoonApiException("Connection to roon lost"))
+        self._pending = {}
@@ -0,0 +1,104 @@
+"""
+Cache of the browse hierarchy for walking media paths.
+
+Walking ["Library", "Artists", "Neil Young", "Harvest"] from the root means
+paging every level with browse_load and comparing titles until each element
+turns up. BrowseCache remembers, for every path prefix walked, the items seen
+at that level indexed by title, so a later walk of the same or a sibling path
+can browse straight to the deepest known item and only page what it has not
+seen yet.
+
+Item keys belong to the core's browse session. The cache is cleared when the
+connection is re-established, when the core rejects a cached key, and when a
+level comes back with a different item count (the library changed). Levels
+also expire after ttl seconds.
+"""
+
+import threading
+import time
+
+
+class BrowseLevel:  # pylint: disable=too-few-public-methods
+    """The items of one browse list seen so far, indexed by title."""
+
+    __slots__ = ("count", "scanned", "titles", "expires")
+
+    def __init__(self, count, expires):
+        """Init an empty level of count items."""
+        self.count = count
+        self.scanned = 0
+        self.titles = {}
+        self.expires = expires
+
+    def add(self, items):
+        """Index a page of items, the first item with a title wins."""
+        for item in items:
+            if "title" not in item:
+                continue
+            self.titles.setdefault(
+                item["title"],
+                {
+                    "title": item["title"],
+                    "item_key": item.get("item_key"),
+                    "hint": item.get("hint"),
+                },
+            )
+        self.scanned += len(items)
+
+
+class BrowseCache:
+    """Path prefix to BrowseLevel map with expiry."""
+
+    # Browsing to these starts playback, they are never jumped to from cache
+    ACTION_HINTS = ("action", "action_list")
+
+    def __init__(self, ttl=300.0, clock=time.monotonic):
+        """Init an empty cache whose levels live for ttl seconds."""
+        self.ttl = ttl
+        self.clock = clock
+        self._levels = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def level(self, prefix, count):
+        """Return the level at prefix, a fresh one if unknown, stale or resized."""
+        prefix = tuple(prefix)
+        now = self.clock()
+        with self._lock:
+            level = self._levels.get(prefix)
+            if level is not None and level.expires > now and level.count == count:
+                return level
+            if level is not None and level.count != count:
+                # The list changed size, whatever was below it may be gone too
+                self._drop(prefix)
+            level = self._levels[prefix] = BrowseLevel(count, now + self.ttl)
+            return level
+
+    def deepest(self, path):
+        """
+        Return (depth, item) for the longest prefix of path whose last item is
+        known, or (0, None).
+        """
+        path = tuple(path)
+        now = self.clock()
+        with self._lock:
+            for depth in range(len(path), 0, -1):
+                level = self._levels.get(path[: depth - 1])
+                if level is None or level.expires <= now:
+                    continue
+                item = level.titles.get(path[depth - 1])
+                if item and item["item_key"] and item["hint"] not in self.ACTION_HINTS:
+                    self.hits += 1
+                    return depth, item
+            self.misses += 1
+            return 0, None
+
+    def clear(self):
+        """Forget everything, item keys are no longer valid."""
+        with self._lock:
+            self._levels.clear()
+
+    def _drop(self, prefix):
+        for key in [k for k in self._levels if k[: len(prefix)] == prefix]:
+            del self._levels[key]
@@ -3,29 +3,97 @@ Module defining a class to discover Roon servers.
 
 If multiple servers are available on the network, the first to be discovered
 is selected. This may not be the one you have enabled the plugin for.
+
+A scan sends the SOOD query by multicast and broadcast on every non-loopback
+IPv4 interface at once, and repeats it at growing intervals in case a packet
+was lost, until the core looked for answers or the timeout passes. The server
+first() finds is remembered for cache_ttl seconds, so asking again, eg
+connecting right after registering, doesn't wait on the network.
 """
 
+import functools
 import os.path
+import select
 import socket
+import struct
 import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # not on Windows
+    fcntl = None
 
 from .soodmessage import FormatException, SOODMessage
 from .constants import SOOD_PORT, SOOD_MULTICAST_IP, LOGGER
 
+SIOCGIFADDR = 0x8915
+SIOCGIFBRDADDR = 0x8919
+
+
+@functools.lru_cache(maxsize=None)
+def sood_query():
+    """The encoded SOOD query, read from .soodmsg once."""
+    this_dir = os.path.dirname(os.path.abspath(__file__))
+    with open(os.path.join(this_dir, ".soodmsg"), "rb") as sood_query_file:
+        return sood_query_file.read()
+
+
+def _interface_address(sock, request, name):
+    ifreq = struct.pack("256s", name.encode()[:15])
+    return socket.inet_ntoa(fcntl.ioctl(sock.fileno(), request, ifreq)[20:24])
+
+
+def interface_addresses():
+    """
+    (address, broadcast address) of each non-loopback IPv4 interface.
+
+    Where interfaces can't be listed, the default interface is probed, which
+    is ("", "<broadcast>").
+    """
+    found = []
+    if fcntl is not None and hasattr(socket, "if_nameindex"):
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for _, name in socket.if_nameindex():
+                try:
+                    address = _interface_address(sock, SIOCGIFADDR, name)
+                except OSError:
+                    continue  # no IPv4 address
+                if address.startswith("127."):
+                    continue
+                try:
+                    broadcast = _interface_address(sock, SIOCGIFBRDADDR, name)
+                except OSError:
+                    broadcast = "0.0.0.0"
+                if broadcast == "0.0.0.0":
+                    broadcast = "<broadcast>"
+                found.append((address, broadcast))
+    return found or [("", "<broadcast>")]
+
 
 class RoonDiscovery(threading.Thread):
     """Class to discover Roon Servers connected in the network."""
 
-    def __init__(self, core_id=None):
+    # Seconds before the query is sent again, doubled after every send
+    RETRY_INTERVAL = 0.25
+
+    # first() results of all instances, core_id: (expires, (host, port))
+    _results = {}
+    _results_lock = threading.Lock()
+
+    def __init__(self, core_id=None, timeout=5, cache_ttl=300):
         """Discover Roon Servers connected in the network."""
         self._exit = threading.Event()
         self._core_id = core_id
+        self._timeout = timeout
+        self._cache_ttl = cache_ttl
+        self.port = SOOD_PORT
         threading.Thread.__init__(self)
         self.daemon = True
 
     def run(self):
         """Run discovery until server found."""
-        while not self._exit.isSet():
+        while not self._exit.is_set():
             host, _ = self.first()
             if host:
                 self.stop()
@@ -36,57 +104,124 @@ class RoonDiscovery(threading.Thread):
 
     def all(self):
         """Scan and return all found entries as a list. Each server is a tuple of host,port."""
-        return self._discover(first_only=False)
+        return [server for _, server in self._discover(first_only=False)]
 
     def first(self):
-        """Return first server that is found."""
-        all_servers = self._discover(first_only=True)
-        return all_servers[0] if all_servers else (None, None)
+        """Return first server that is found, or the one found recently."""
+        with self._results_lock:
+            expires, server = self._results.get(self._core_id, (0, None))
+        if server is not None and expires > time.monotonic():
+            LOGGER.debug("Using recently discovered %s", server)
+            return server
+
+        found = self._discover(first_only=True)
+        if not found:
+            return (None, None)
+        unique_id, server = found[0]
+        expires = time.monotonic() + self._cache_ttl
+        with self._results_lock:
+            # Also under its id, for a later search for this very core
+            self._results[self._core_id] = self._results[unique_id] = (expires, server)
+        return server
+
+    @classmethod
+    def forget(cls, core_id=None):
+        """Drop the remembered server for core_id, eg when it can't be reached."""
+        with cls._results_lock:
+            cls._results.pop(core_id, None)
 
-    # pylint: disable=too-many-locals,unspecified-encoding
     def _discover(self, first_only=False):
-        """Update the server entry with details."""
-        this_dir = os.path.dirname(os.path.abspath(__file__))
-        sood_file = os.path.join(this_dir, ".soodmsg")
-        with open(sood_file) as sood_query_file:
-            msg = sood_query_file.read()
-        msg = msg.encode()
-        entries = []
-
-        with socket.socket(
-            socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP
-        ) as sock:
-            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 32)
-            sock.sendto(msg, (SOOD_MULTICAST_IP, SOOD_PORT))
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-            sock.sendto(msg, ("<broadcast>", SOOD_PORT))
-            sock.settimeout(5)
-            while not self._exit.isSet():
-                try:
-                    data, server = sock.recvfrom(1024)
-                    message = SOODMessage(data).as_dictionary
-
-                    host = server[0]
-                    port = message["properties"]["http_port"]
-                    unique_id = message["properties"]["unique_id"]
-                    LOGGER.debug("Discovered %s", message)
-
-                    if self._core_id is not None and self._core_id != unique_id:
-                        LOGGER.debug(
-                            "Ignoring server with id %s, because we're looking for %s",
-                            unique_id,
-                            self._core_id,
-                        )
+        """
+        Probe every interface until the timeout, or the first server if
+        first_only. Returns a list of (unique_id, (host, port)).
+        """
+        sockets = self._open_sockets()
+        entries = {}
+        try:
+            deadline = time.monotonic() + self._timeout
+            interval = self.RETRY_INTERVAL
+            probe_at = 0
+            while sockets and not self._exit.is_set():
+                now = time.monotonic()
+                if now >= deadline:
+                    LOGGER.debug("Timeout")
+                    break
+                if now >= probe_at:
+                    for sock, broadcast in sockets.items():
+                        self._probe(sock, broadcast)
+                    probe_at = now + interval
+                    interval *= 2
+                readable, _, _ = select.select(
+                    list(sockets), [], [], min(probe_at, deadline) - now
+                )
+                for sock in readable:
+                    found = self._receive(sock)
+                    # a core answers every probe, on every interface it shares
+                    if found is None or found[0] in entries:
                         continue
-
-                    entries.append((host, port))
+                    entries[found[0]] = found[1]
                     if first_only:
                         # we're only interested in the first server found
                         break
-                except socket.timeout:
-                    LOGGER.debug("Timeout")
-                    break
-                except FormatException as format_exception:
-                    LOGGER.error("Format exception %s", format_exception.message)
+                if first_only and entries:
                     break
-        return entries
+        finally:
+            for sock in sockets:
+                sock.close()
+        return list(entries.items())
+
+    def _open_sockets(self):
+        """A socket bound to each interface, mapped to its broadcast address."""
+        sockets = {}
+        for address, broadcast in interface_addresses():
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+            try:
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 32)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+                if address:
+                    sock.setsockopt(
+                        socket.IPPROTO_IP,
+                        socket.IP_MULTICAST_IF,
+                        socket.inet_aton(address),
+                    )
+                sock.bind((address, 0))
+            except OSError as error:
+                LOGGER.debug("Not probing from %s: %s", address, error)
+                sock.close()
+                continue
+            sockets[sock] = broadcast
+        return sockets
+
+    def _probe(self, sock, broadcast):
+        for destination in (SOOD_MULTICAST_IP, broadcast):
+            try:
+                sock.sendto(sood_query(), (destination, self.port))
+            except OSError as error:
+                # eg no multicast route, the other destination may still work
+                LOGGER.debug("Unable to probe %s: %s", destination, error)
+
+    def _receive(self, sock):
+        """Read one answer, returns (unique_id, (host, port)) or None to ignore it."""
+        try:
+            data, server = sock.recvfrom(1024)
+            message = SOODMessage(data).as_dictionary
+        except OSError as error:
+            LOGGER.debug("Unable to receive: %s", error)
+            return None
+        except FormatException as format_exception:
+            LOGGER.error("Format exception %s", format_exception.message)
+            return None
+        LOGGER.debug("Discovered %s", message)
+        properties = message["properties"]
+        if "unique_id" not in properties or "http_port" not in properties:
+            return None  # another query, not an answer
+
+        unique_id = properties["unique_id"]
+        if self._core_id is not None and self._core_id != unique_id:
+            LOGGER.debug(
+                "Ignoring server with id %s, because we're looking for %s",
+                unique_id,
+                self._core_id,
+            )
+            return None
+        return unique_id, (server[0], properties["http_port"])
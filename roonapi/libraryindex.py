@@ -0,0 +1,172 @@
+"""
+Local full-text index of the Roon library.
+
+list_media and search_browse find media by paging a browse list from the core
+and comparing titles, a round trip per page on every search. LibraryIndex
+crawls the top lists of the browse hierarchy in the background, on a browse
+session of its own, and keeps their titles and paths in a SQLite FTS5 table,
+so RoonApi.search_local answers from disk in milliseconds. The paths it
+returns can be handed straight to play_media.
+
+Each refresh pages the lists again, compares them with what was indexed and
+only writes the items that were added, removed or changed. A list that can't
+be paged to its end is left as it was indexed.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+
+from .constants import LOGGER
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS media USING fts5(
+    title, subtitle, root UNINDEXED, path UNINDEXED,
+    tokenize = "unicode61 remove_diacritics 2"
+);
+CREATE TABLE IF NOT EXISTS crawls (
+    root TEXT PRIMARY KEY, count INTEGER, crawled REAL
+);
+"""
+
+
+class LibraryIndex:
+    """SQLite FTS5 index of the items of a few browse lists."""
+
+    ROOTS = (
+        ("Library", "Artists"),
+        ("Library", "Albums"),
+        ("Playlists",),
+        ("Genres",),
+    )
+    SESSION = "library_index"
+    # A title match counts for more than one on the subtitle (the artist)
+    RANK = "bm25(media, 10.0, 1.0)"
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self, roonapi, db_path, zone_or_output_id, refresh_seconds=6 * 3600, roots=None
+    ):
+        """Open or create the index in the SQLite database at db_path."""
+        self.roonapi = roonapi
+        self.zone_or_output_id = zone_or_output_id
+        self.refresh_seconds = refresh_seconds
+        self.roots = [tuple(root) for root in roots or self.ROOTS]
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._running = False
+
+    def start(self):
+        """Crawl now and then every refresh_seconds in a daemon thread."""
+        if self._running:
+            return
+        self._running = True
+        thread = threading.Thread(target=self.run, name="library-index")
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        """Stop crawling after the current list."""
+        self._running = False
+        self._wakeup.set()
+
+    def run(self):
+        """Refresh until stopped."""
+        while self._running:
+            self.refresh()
+            self._wakeup.wait(self.refresh_seconds)
+            self._wakeup.clear()
+
+    def refresh(self):
+        """Crawl every root, returns the number of titles added and removed."""
+        added = removed = 0
+        for root in self.roots:
+            if not self._running and self._wakeup.is_set():
+                break
+            try:
+                root_added, root_removed = self.refresh_root(root)
+            # pylint: disable=broad-except
+            except Exception:
+                LOGGER.exception("Unable to index %s", list(root))
+                continue
+            added += root_added
+            removed += root_removed
+        LOGGER.info("Library index: %d added, %d removed", added, removed)
+        return added, removed
+
+    def refresh_root(self, root):
+        """Page the list at root and apply the differences to the index."""
+        # Raises if the list can't be browsed or ends early, a partial crawl
+        # would otherwise remove everything it missed from the index
+        items = {}  # ordered, so ties in search rank go by list order
+        for item in self.roonapi.iter_browse(
+            self.zone_or_output_id, root, multi_session_key=self.SESSION, strict=True
+        ):
+            if item.get("title") and item.get("hint") == "list":
+                items.setdefault((item["title"], item.get("subtitle") or ""))
+
+        key = json.dumps(root)
+        with self._lock, self._db:
+            indexed = set(
+                self._db.execute(
+                    "SELECT title, subtitle FROM media WHERE root = ?", (key,)
+                )
+            )
+            removed = indexed.difference(items)
+            added = [pair for pair in items if pair not in indexed]
+            self._db.executemany(
+                "DELETE FROM media WHERE root = ? AND title = ? AND subtitle = ?",
+                [(key, title, subtitle) for title, subtitle in removed],
+            )
+            self._db.executemany(
+                "INSERT INTO media (title, subtitle, root, path) VALUES (?, ?, ?, ?)",
+                [
+                    (title, subtitle, key, json.dumps(root + (title,)))
+                    for title, subtitle in added
+                ],
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO crawls VALUES (?, ?, ?)",
+                (key, len(items), time.time()),
+            )
+        # A changed subtitle is a removal and an addition
+        return len(added), len(removed)
+
+    def search(self, query, limit=20):
+        """
+        Paths of the items matching every word of query, best match first.
+
+        Items are found by title and subtitle, but a path only holds titles.
+        When a list has several items of the same title, eg albums called
+        "Greatest Hits", their path is the same and play_media plays the
+        first of them in the list, so the path is returned once.
+        """
+        words = re.findall(r"\w+", query)
+        if not words:
+            return []
+        # Quoted so words are never read as FTS5 operators, prefix matched
+        # so results show up while a name is still being typed
+        match = " ".join('"%s"*' % word for word in words)
+        paths = []
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT path FROM media WHERE media MATCH ? ORDER BY %s, rowid"
+                % self.RANK,
+                (match,),
+            )
+            for (path,) in rows:
+                if path not in paths:
+                    paths.append(path)
+                    if len(paths) == limit:
+                        break
+        return [json.loads(path) for path in paths]
+
+    def crawled(self):
+        """Dict of root path to (item count, time of the last crawl)."""
+        with self._lock:
+            rows = self._db.execute("SELECT root, count, crawled FROM crawls")
+            return {tuple(json.loads(root)): (count, at) for root, count, at in rows}
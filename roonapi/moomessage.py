@@ -0,0 +1,160 @@
+r"""
+MOO/1 messages consist of a first line, a list of headers, a blank line and an optional body.
+
+    MOO/1 <verb> <name>\n
+    Request-Id: <id>\n
+    Content-Length: <length>\n
+    Content-Type: application/json\n
+    \n
+    <body>
+
+The first line and headers are always ASCII and short, the body can be a large
+JSON document (zones_changed, browse results). MOOMessage only scans and
+decodes the header part; the body is only located in the received frame and
+handed to the JSON decoder when asked for.
+
+Most frames are short, eg a seek tick once a second for every playing zone,
+so headers in the order the core sends them are read with a single regular
+expression and only turned into a dict when asked for. Other frames take the
+general path, which splits every header line.
+"""
+
+import re
+
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+
+# Request-Id, then Content-Length and Content-Type if there is a body
+FAST_HEADER_RE = re.compile(
+    rb"(MOO/1 [^\n]*)\nRequest-Id: (\d+)\n"
+    rb"(?:Content-Length: (\d+)\nContent-Type: ([^\n]*)\n)?\n"
+)
+
+
+class MOOFormatException(Exception):
+    """Exception to be raised on errors in a MOO/1 message."""
+
+
+class MOOMessage:  # pylint: disable=too-few-public-methods
+    """Class for parsing MOO/1 messages from raw bytes."""
+
+    __slots__ = (
+        "first_line",
+        "request_id",
+        "content_type",
+        "_headers",
+        "_raw",
+        "_header_end",
+        "_start",
+        "_end",
+    )
+
+    __MESSAGE_PREFIX__ = b"MOO/1 "
+
+    def __init__(self, message):
+        """
+        Init with the raw frame (bytes, bytearray or memoryview) to parse.
+
+        Frames that aren't bytes are copied once, websocket clients hand over
+        bytes.
+        """
+        if isinstance(message, str):
+            message = message.encode("utf-8")
+        elif not isinstance(message, bytes):
+            message = bytes(message)
+        self._raw = message
+        self._headers = None
+
+        match = FAST_HEADER_RE.match(message)
+        if match is not None:
+            first_line, request_id, length, content_type = match.groups()
+            self.first_line = first_line.decode("ascii")
+            self.request_id = int(request_id)
+            if content_type is not None:
+                content_type = content_type.decode("ascii")
+            self.content_type = content_type
+            self._start = match.end()
+            self._header_end = self._start - 2
+            self._end = len(message)
+            if length is not None:
+                self._end = min(self._start + int(length), self._end)
+            return
+
+        if not message.startswith(self.__MESSAGE_PREFIX__):
+            raise MOOFormatException("Error in message header")
+        header_end = message.find(b"\n\n")
+        if header_end < 0:
+            header_end = body_start = len(message)
+        else:
+            body_start = header_end + 2
+        self._header_end = header_end
+        line_end = message.find(b"\n", 0, header_end)
+        if line_end < 0:
+            line_end = header_end
+        self.first_line = message[:line_end].decode("ascii")
+        headers = self.headers
+
+        request_id = headers.get("Request-Id")
+        self.request_id = int(request_id) if request_id is not None else None
+        self.content_type = headers.get("Content-Type")
+        self._start = body_start
+        self._end = len(message)
+        content_length = headers.get("Content-Length")
+        if content_length is not None:
+            self._end = min(body_start + int(content_length), self._end)
+
+    @property
+    def verb(self):
+        """Return the verb of the first line, eg REQUEST or COMPLETE."""
+        parts = self.first_line.split(" ", 2)
+        return parts[1] if len(parts) > 1 else ""
+
+    @property
+    def name(self):
+        """Return the name of the first line, eg Success or the request path."""
+        parts = self.first_line.split(" ", 2)
+        return parts[2] if len(parts) > 2 else ""
+
+    @property
+    def headers(self):
+        """Return the headers as a dict, parsed on first use."""
+        if self._headers is None:
+            lines = self._raw[: self._header_end].decode("ascii").split("\n")
+            self._headers = {}
+            for line in lines[1:]:
+                key, sep, value = line.partition(":")
+                if sep:
+                    self._headers[key.strip()] = value.strip()
+        return self._headers
+
+    @property
+    def body(self):
+        """Return the body as a memoryview, without copying it."""
+        return memoryview(self._raw)[self._start : self._end]
+
+    def json(self):
+        """Decode the JSON body, or return None if the message has none."""
+        if self._start >= self._end:
+            return None
+        # Decoding first is quicker than handing the decoder bytes
+        return json.loads(self._raw[self._start : self._end].decode("utf-8"))
+
+    @property
+    def content(self):
+        """
+        Return the body in the form the roon callbacks expect.
+
+        JSON bodies are decoded, other bodies are returned as text. Messages
+        without a body return the first line, unless they carry a Logging
+        header.
+        """
+        if self.content_type is None:
+            return "" if "Logging" in self.headers else self.first_line
+        if self.content_type == "application/json":
+            if self._start >= self._end:
+                return None
+            return json.loads(self._raw[self._start : self._end].decode("utf-8"))
+        return self._raw[self._start : self._end].decode("utf-8")
@@ -3,6 +3,9 @@ from __future__ import unicode_literals
 import threading
 import time
 import csv
+from collections import deque
+from contextlib import closing
+from itertools import islice
 
 from .constants import (
     LOGGER,
@@ -12,6 +15,8 @@ from .constants import (
     SERVICE_TRANSPORT,
     CONTROL_VOLUME,
 )
+from .browsecache import BrowseCache
+from .libraryindex import LibraryIndex
 from .roonapisocket import RoonApiWebSocket
 
 
@@ -32,6 +37,10 @@ class RoonApiException(Exception):
         super().__init__(msg)
 
 
+class RoonApiTimeoutException(RoonApiException):
+    """Raised when the roon server does not answer a request in time."""
+
+
 def split_media_path(path):
     """Split a path (eg path/to/media) into a list for use by play_media."""
 
@@ -53,6 +62,9 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
     _outputs = {}
     _state_callbacks = []
     ready = False
+    _request_timeout = 2.5
+    _browse_window = 4
+    _library_index = None
 
     _volume_controls_request_id = None
     _volume_controls = {}
@@ -67,6 +79,11 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
         """Return the roon host."""
         return self._host
 
+    @property
+    def port(self):
+        """Return the roon websocket port."""
+        return self._port
+
     @property
     def core_id(self):
         """Return the roon host."""
@@ -89,25 +106,15 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
 
     def zone_by_name(self, zone_name):
         """Get zone details by name."""
-        for zone in self.zones.values():
-            if zone["display_name"] == zone_name:
-                return zone
-        return None
+        return self._zones.get(self._zone_ids_by_name.get(zone_name))
 
     def output_by_name(self, output_name):
         """Get the output details from the name."""
-        for output in self.outputs.values():
-            if output["display_name"] == output_name:
-                return output
-        return None
+        return self._outputs.get(self._output_ids_by_name.get(output_name))
 
     def zone_by_output_id(self, output_id):
         """Get the zone details by output id."""
-        for zone in self.zones.values():
-            for output in zone["outputs"]:
-                if output["output_id"] == output_id:
-                    return zone
-        return None
+        return self._zones.get(self._zone_ids_by_output_id.get(output_id))
 
     def zone_by_output_name(self, output_name):
         """
@@ -118,11 +125,7 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
         returns: full zone details (dict)
         """
 
-        for zone in self.zones.values():
-            for output in zone["outputs"]:
-                if output["display_name"] == output_name:
-                    return zone
-        return None
+        return self.zone_by_output_id(self._output_ids_by_name.get(output_name))
 
     def is_grouped(self, output_id):
         """
@@ -492,90 +495,170 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
         """
         return self._request(SERVICE_BROWSE + "/load", opts)
 
-    def list_media(self, zone_or_output_id, path):
+    def browse_load_pages(self, opts, total_count, offset=0, window=None):
         """
-        List the media specified.
-
-        params:
-            zone_or_output_id: where to play the media
-            path: a list allowing roon to find the media
-                  eg ["Library", "Artists", "Neil Young", "Harvest"] or ["My Live Radio", "BBC Radio 4"]
+        Generate the pages of the current browse list from offset on.
+
+        Up to window browse_load requests (browse_window by default) are kept
+        in flight on the websocket and the pages are yielded in order, so
+        paging a long list costs about one round trip per window instead of
+        one per page. Stopping early drops the replies still outstanding.
+        Raises RoonApiTimeoutException if a page doesn't arrive within
+        request_timeout.
         """
+        command = SERVICE_BROWSE + "/load"
+        count = opts.get("count", PAGE_SIZE)
+        window = max(1, window or self._browse_window)
+        in_flight = deque()
+        try:
+            while in_flight or offset < total_count:
+                while len(in_flight) < window and offset < total_count:
+                    request_id = self._send(command, dict(opts, offset=offset))
+                    if request_id is None:
+                        total_count = offset
+                        break
+                    in_flight.append(request_id)
+                    offset += count
+                if not in_flight:
+                    return
+                result = self._wait(command, in_flight.popleft())
+                items = result.get("items") if isinstance(result, dict) else None
+                if not items:
+                    return
+                yield items
+        finally:
+            for request_id in in_flight:
+                self._cancel(request_id)
+
+    def browse_load_items(self, opts, total_count, offset=0, window=None):
+        """Generate the items of the current browse list, see browse_load_pages."""
+        for items in self.browse_load_pages(opts, total_count, offset, window):
+            yield from items
+
+    def iter_browse(
+        self, zone_or_output_id, path, multi_session_key=None, strict=False
+    ):
+        """
+        Generate the items of the list at path, page by page.
 
-        opts = {
-            "zone_or_output_id": zone_or_output_id,
-            "hierarchy": "browse",
-            "count": PAGE_SIZE,
-            "pop_all": True,
-        }
-
-        total_count = self.browse_browse(opts)["list"]["count"]
-        del opts["pop_all"]
+        Pages are only requested as the caller consumes items (at most
+        browse_window ahead), so stopping early stops the paging and memory
+        stays flat however long the list is. Nothing is generated if path
+        can't be found, and the items stop early if a page can't be loaded.
 
-        load_opts = {
-            "zone_or_output_id": zone_or_output_id,
-            "hierarchy": "browse",
-            "count": PAGE_SIZE,
-            "offset": 0,
-        }
-        items = []
-        searchterm = path[-1]
-        path.pop()
-        for element in path:
-            load_opts["offset"] = 0
-            found = None
-            searched = 0
+        params:
+            zone_or_output_id: the zone or output the browse session is for
+            path: the titles leading to the list, eg ["Library", "Artists"]
+            multi_session_key: browse in a session of its own, so a long
+                               walk doesn't move play_media's position
+            strict: raise RoonApiException instead when path can't be
+                    browsed or the list ends before its item count
+        """
+        items = self._browse_items(zone_or_output_id, path, multi_session_key, strict)
+        if items is not None:
+            yield from items
 
-            LOGGER.debug("Looking for %s", element)
-            while searched < total_count and found is None:
-                items = self.browse_load(load_opts)["items"]
+    def search_browse(self, zone_or_output_id, path, searchterm, limit=None):
+        """
+        Generate the items of the list at path whose title contains searchterm.
 
-                for item in items:
-                    searched += 1
-                    if item["title"] == element:
-                        found = item
-                        break
+        searchterm "__all__" matches every item. Stops after limit matches.
+        """
+        items = self.iter_browse(zone_or_output_id, path)
+        yield from islice(self._matching(items, searchterm), limit)
 
-                load_opts["offset"] += PAGE_SIZE
-            if searched >= total_count and found is None:
-                LOGGER.debug(
-                    "Could not find media path element '%s' in %s",
-                    element,
-                    [item["title"] for item in items],
-                )
-                return None
+    def enable_library_index(
+        self, db_path, zone_or_output_id, refresh_seconds=6 * 3600, roots=None
+    ):
+        """
+        Start indexing the library for search_local, returns the LibraryIndex.
 
-            opts["item_key"] = found["item_key"]
-            load_opts["item_key"] = found["item_key"]
+        The index lives in the SQLite database at db_path and is crawled in
+        the background, now and every refresh_seconds, by browsing the lists
+        in roots (LibraryIndex.ROOTS by default) on a session of its own.
+        """
+        if self._library_index is None:
+            self._library_index = LibraryIndex(
+                self, db_path, zone_or_output_id, refresh_seconds, roots
+            )
+            self._library_index.start()
+        return self._library_index
 
-            total_count = self.browse_browse(opts)["list"]["count"]
+    def search_local(self, query, limit=20):
+        """
+        Search the local library index, best match first.
 
-            load_opts["offset"] = 0
-            items = self.browse_load(load_opts)["items"]
+        Returns up to limit paths, eg ["Library", "Albums", "Harvest"], to be
+        passed to play_media. Nothing goes over the network, so this only
+        finds what the last crawl saw.
+        """
+        if self._library_index is None:
+            raise RoonApiException("The library index is not enabled")
+        return self._library_index.search(query, limit)
 
-        LOGGER.debug("Searching for %s", searchterm)
-        load_opts["offset"] = 0
-        searched = 0
-        matched = []
-        while searched < total_count:
-            items = self.browse_load(load_opts)["items"]
+    def list_media(self, zone_or_output_id, path):
+        """
+        List the media specified.
 
-            if searchterm == "__all__":
-                for item in items:
-                    searched += 1
-                    matched.append(item["title"])
-            else:
-                for item in items:
-                    searched += 1
-                    if searchterm in item["title"]:
-                        matched.append(item["title"])
+        params:
+            zone_or_output_id: where to play the media
+            path: a list allowing roon to find the media, the last element
+                  is a search term matched against the titles of the list
+                  the others lead to, or "__all__"
+                  eg ["Library", "Artists", "Neil"] or ["My Live Radio", "__all__"]
+        """
+        items = self._browse_items(zone_or_output_id, path[:-1])
+        if items is None:
+            return None
+        LOGGER.debug("Searching for %s", path[-1])
+        return [item["title"] for item in self._matching(items, path[-1])]
 
-            load_opts["offset"] += PAGE_SIZE
+    def _browse_items(
+        self, zone_or_output_id, path, multi_session_key=None, strict=False
+    ):
+        """Walk to path now and return a generator of its items, or None."""
+        walked = self._walk_browse(
+            zone_or_output_id, path, report_error=False, session=multi_session_key
+        )
+        if walked is None or walked[3] is None:
+            if strict:
+                raise RoonApiException("Unable to browse to list %s" % list(path))
+            return None
+        _, load_opts, _, total_count = walked
+        items = self.browse_load_items(load_opts, total_count)
+        if strict:
+            return self._complete(items, total_count, path)
+        return self._until_timeout(items)
+
+    @staticmethod
+    def _until_timeout(items):
+        """Generate items, stop early if a page times out."""
+        try:
+            yield from items
+        except RoonApiTimeoutException as exc:
+            LOGGER.warning("%s", exc)
+
+    @staticmethod
+    def _complete(items, total_count, path):
+        """Generate items, raise RoonApiException if fewer than total_count."""
+        loaded = 0
+        for item in items:
+            loaded += 1
+            yield item
+        if loaded < total_count:
+            raise RoonApiException(
+                "Browsing %s ended after %d of %d items"
+                % (list(path), loaded, total_count)
+            )
 
-        return matched
+    @staticmethod
+    def _matching(items, searchterm):
+        for item in items:
+            if searchterm == "__all__" or searchterm in item.get("title", ""):
+                yield item
 
     def play_media(self, zone_or_output_id, path, action=None, report_error=True):
-        # pylint: disable=too-many-locals,too-many-branches,too-many-return-statements,too-many-statements
+        # pylint: disable=too-many-branches,too-many-return-statements
         """
         Play the media specified.
 
@@ -586,64 +669,19 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
             action: the roon action to take to play the media - leave blank to choose the roon default
                     eg "Play Now", "Queue" or "Start Radio"
         """
+        walked = self._walk_browse(zone_or_output_id, path, report_error)
+        if walked is None:
+            return None
+        opts, load_opts, _, total_count = walked
+        if total_count is None:
+            # Loading item we found already started playing
+            return True
 
-        opts = {
-            "zone_or_output_id": zone_or_output_id,
-            "hierarchy": "browse",
-            "count": PAGE_SIZE,
-            "pop_all": True,
-        }
-
-        total_count = self.browse_browse(opts)["list"]["count"]
-        del opts["pop_all"]
-
-        load_opts = {
-            "zone_or_output_id": zone_or_output_id,
-            "hierarchy": "browse",
-            "count": PAGE_SIZE,
-            "offset": 0,
-        }
-        items = []
-        for element in path:
-            load_opts["offset"] = 0
-            found = None
-            searched = 0
-
-            LOGGER.debug("Looking for %s", element)
-            while searched < total_count and found is None:
-                items = self.browse_load(load_opts)["items"]
-
-                for item in items:
-                    searched += 1
-                    if item["title"] == element:
-                        found = item
-                        break
-
-                load_opts["offset"] += PAGE_SIZE
-            if searched >= total_count and found is None:
-                if report_error:
-                    LOGGER.error(
-                        "Could not find media path element '%s' in %s",
-                        element,
-                        [item["title"] for item in items],
-                    )
-                return None
-
-            opts["item_key"] = found["item_key"]
-            load_opts["item_key"] = found["item_key"]
-
-            try:
-                total_count = self.browse_browse(opts)["list"]["count"]
-            except TypeError:
-                LOGGER.error("Exception trying to play media")
-                return None
-
-            load_opts["offset"] = 0
-            items = self.browse_load(load_opts)["items"]
-
-            if found["hint"] == "action":
-                # Loading item we found already started playing
-                return True
+        load_opts["offset"] = 0
+        items = self.browse_load(load_opts)["items"]
+        if not items:
+            LOGGER.error("Found media %s is empty", path)
+            return False
 
         # First item shoule be the action/action_list for playing this item (eg Play Genre, Play Artist, Play Album)
         if items[0].get("hint") not in ["action_list", "action"]:
@@ -696,6 +734,103 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
         self.browse_browse(opts)
         return True
 
+    def _walk_browse(self, zone_or_output_id, path, report_error=True, session=None):
+        """
+        Browse to the list at the end of path, starting from the deepest item
+        the browse cache knows.
+
+        Returns (opts, load_opts, found, total_count) with the core showing
+        that list, where found is the item for the last path element, or None
+        if an element can't be found. total_count is None if found was an
+        action, browsing to it already started playback.
+        """
+        opts = {
+            "zone_or_output_id": zone_or_output_id,
+            "hierarchy": "browse",
+            "count": PAGE_SIZE,
+        }
+        load_opts = {
+            "zone_or_output_id": zone_or_output_id,
+            "hierarchy": "browse",
+            "count": PAGE_SIZE,
+            "offset": 0,
+        }
+        if session is not None:
+            opts["multi_session_key"] = session
+            load_opts["multi_session_key"] = session
+        cache = self._session_cache(session)
+        path = list(path)
+
+        start, found = cache.deepest(path)
+        if found is not None:
+            LOGGER.debug("Browsing straight to cached %s", path[:start])
+            total_count = self._browse_into(opts, load_opts, found)
+            if total_count is None:
+                LOGGER.debug("Cached item key for %s is stale", path[:start])
+                cache.clear()
+                start, found = 0, None
+        if found is None:
+            opts["pop_all"] = True
+            total_count = self.browse_browse(opts)["list"]["count"]
+            del opts["pop_all"]
+
+        for depth in range(start, len(path)):
+            element = path[depth]
+            LOGGER.debug("Looking for %s", element)
+            level = cache.level(path[:depth], total_count)
+            found = self._find_in_level(level, element, load_opts)
+            if found is None:
+                if report_error:
+                    LOGGER.error(
+                        "Could not find media path element '%s' in %s",
+                        element,
+                        list(level.titles)[:PAGE_SIZE],
+                    )
+                return None
+
+            if found.get("hint") == "action":
+                opts["item_key"] = found["item_key"]
+                self.browse_browse(opts)
+                return opts, load_opts, found, None
+
+            total_count = self._browse_into(opts, load_opts, found)
+            if total_count is None:
+                LOGGER.error("Exception trying to browse to '%s'", element)
+                cache.clear()
+                return None
+
+        return opts, load_opts, found, total_count
+
+    def _session_cache(self, session):
+        """The browse cache for a browse session, item keys aren't shared."""
+        if session is None:
+            return self._browse_cache
+        return self._session_caches.setdefault(
+            session, BrowseCache(self._browse_cache.ttl)
+        )
+
+    def _browse_into(self, opts, load_opts, item):
+        """Browse to item, returns the item count of its list or None."""
+        opts["item_key"] = item["item_key"]
+        load_opts["item_key"] = item["item_key"]
+        result = self.browse_browse(opts)
+        if isinstance(result, dict) and isinstance(result.get("list"), dict):
+            return result["list"]["count"]
+        return None
+
+    def _find_in_level(self, level, element, load_opts):
+        """Find element by title, paging in only what the level hasn't seen."""
+        found = level.titles.get(element)
+        if found is None and level.scanned < level.count:
+            pages = self.browse_load_pages(load_opts, level.count, level.scanned)
+            with closing(pages):
+                for items in self._until_timeout(pages):
+                    level.add(items)
+                    found = level.titles.get(element)
+                    if found is not None:
+                        break
+        return found
+
     # pylint: disable=too-many-return-statements
     def play_id(self, zone_or_output_id, media_id):
         """Play based on the media_id from the browse api."""
@@ -777,6 +912,9 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
         port,
         blocking_init=True,
         timeout=5,
+        request_timeout=2.5,
+        browse_cache_ttl=300,
+        browse_window=4,
     ):
         """
         Set up the connection with Roon.
@@ -789,9 +927,21 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
                        if you set bool to False the init will continue but you will only receive data once the connection is fully initialized.
                        The latter is preferred if you're (only) using the callbacks
         timeout: If blocking_init is set to False, this will be the maximum time to wait for the connection to be initialized.
+        request_timeout: maximum time in seconds to wait for the answer to a request. The request methods then return None,
+                         request, browse_load_pages and browse_load_items raise RoonApiTimeoutException.
+        browse_cache_ttl: seconds play_media and list_media may reuse the item keys of a browse level.
+        browse_window: browse_load requests kept in flight when paging through a list.
         """
         self._appinfo = appinfo
         self._token = token
+        self._request_timeout = request_timeout
+        self._zone_ids_by_name = {}
+        self._zone_ids_by_output_id = {}
+        self._output_ids_by_name = {}
+        self._browse_cache = BrowseCache(browse_cache_ttl)
+        self._session_caches = {}
+        self._browse_window = browse_window
+        self._library_index = None
 
         if not appinfo or not isinstance(appinfo, dict):
             raise RoonApiException("Appinfo missing or in incorrect format")
@@ -812,6 +962,8 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
                 time.sleep(0.05)
                 timeout -= 0.05
                 if timeout <= 0:
+                    # Don't leave the websocket thread reconnecting behind us
+                    self.stop()
                     raise Exception("Roon API init timed out")
 
         # fill zones and outputs dicts one time so the data is available right away
@@ -821,6 +973,7 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
                 self._zones = self._get_zones()
             if not self._outputs:
                 self._outputs = self._get_outputs()
+            self._rebuild_indexes()
 
         # start socket watcher
         thread_id = threading.Thread(target=self._socket_watcher)
@@ -840,6 +993,8 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
     def stop(self):
         """Stop socket."""
         self._exit = True
+        if self._library_index:
+            self._library_index.stop()
         if self._roonsocket:
             self._roonsocket.stop()
 
@@ -864,6 +1019,10 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
         LOGGER.debug("Connection with roon websockets (re)created.")
         self.ready = False
         self._volume_controls_request_id = None
+        # item keys belong to the old browse session
+        self._browse_cache.clear()
+        for cache in list(self._session_caches.values()):
+            cache.clear()
         # authenticate / register
         # warning: at first launch the user has to approve the app in the Roon settings.
         appinfo = self._appinfo.copy()
@@ -907,10 +1066,15 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
                 "zones",
             ]:
                 for zone in state_values:
+                    reindex = "display_name" in zone or "outputs" in zone
+                    if reindex:
+                        self._unindex_zone(zone["zone_id"])
                     if zone["zone_id"] in self._zones:
                         self._zones[zone["zone_id"]].update(zone)
                     else:
                         self._zones[zone["zone_id"]] = zone
+                    if reindex:
+                        self._index_zone(self._zones[zone["zone_id"]])
                     changed_ids.append(zone["zone_id"])
                     if "display_name" in zone:
                         filter_keys.append(zone["display_name"])
@@ -926,10 +1090,12 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
                 events.append((event, changed_ids, filter_keys))
             elif state_key in ["outputs_changed", "outputs_added", "outputs"]:
                 for output in state_values:
+                    self._unindex_output(output["output_id"])
                     if output["output_id"] in self._outputs:
                         self._outputs[output["output_id"]].update(output)
                     else:
                         self._outputs[output["output_id"]] = output
+                    self._index_output(self._outputs[output["output_id"]])
                     changed_ids.append(output["output_id"])
                     filter_keys.append(output["display_name"])
                     filter_keys.append(output["zone_id"])
@@ -937,9 +1103,11 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
                 events.append((event, changed_ids, filter_keys))
             elif state_key == "zones_removed":
                 for item in state_values:
+                    self._unindex_zone(item)
                     del self._zones[item]
             elif state_key == "outputs_removed":
                 for item in state_values:
+                    self._unindex_output(item)
                     del self._outputs[item]
             else:
                 LOGGER.warning("unknown state change: %s" % msg)
@@ -959,6 +1127,61 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
                 except Exception:
                     LOGGER.exception("Error while executing callback!")
 
+    def _index_zone(self, zone):
+        """Add a zone and its outputs to the lookup indexes."""
+        zone_id = zone["zone_id"]
+        if "display_name" in zone:
+            self._zone_ids_by_name[zone["display_name"]] = zone_id
+        for output in zone.get("outputs", []):
+            self._zone_ids_by_output_id[output["output_id"]] = zone_id
+            self._output_ids_by_name[output["display_name"]] = output["output_id"]
+
+    def _unindex_zone(self, zone_id):
+        """Remove a zone and its outputs from the lookup indexes."""
+        zone = self._zones.get(zone_id)
+        if not zone:
+            return
+        if self._zone_ids_by_name.get(zone.get("display_name")) == zone_id:
+            del self._zone_ids_by_name[zone["display_name"]]
+        for output in zone.get("outputs", []):
+            output_id = output["output_id"]
+            if self._zone_ids_by_output_id.get(output_id) == zone_id:
+                del self._zone_ids_by_output_id[output_id]
+            # An output still in the outputs dict keeps its name
+            name = output.get("display_name")
+            if (
+                output_id not in self._outputs
+                and self._output_ids_by_name.get(name) == output_id
+            ):
+                del self._output_ids_by_name[name]
+
+    def _index_output(self, output):
+        """Add an output to the lookup indexes."""
+        self._output_ids_by_name[output["display_name"]] = output["output_id"]
+        if output.get("zone_id"):
+            self._zone_ids_by_output_id[output["output_id"]] = output["zone_id"]
+
+    def _unindex_output(self, output_id):
+        """Remove an output from the lookup indexes."""
+        output = self._outputs.get(output_id)
+        if not output:
+            return
+        if self._output_ids_by_name.get(output["display_name"]) == output_id:
+            del self._output_ids_by_name[output["display_name"]]
+        zone_id = output.get("zone_id")
+        if zone_id and self._zone_ids_by_output_id.get(output_id) == zone_id:
+            del self._zone_ids_by_output_id[output_id]
+
+    def _rebuild_indexes(self):
+        """Rebuild the lookup indexes from the zones and outputs dicts."""
+        self._zone_ids_by_name = {}
+        self._zone_ids_by_output_id = {}
+        self._output_ids_by_name = {}
+        for output in list(self._outputs.values()):
+            self._index_output(output)
+        for zone in list(self._zones.values()):
+            self._index_zone(zone)
+
     def _get_outputs(self):
         outputs = {}
         data = self._request(SERVICE_TRANSPORT + "/get_outputs")
@@ -975,8 +1198,36 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
                 zones[zone["zone_id"]] = zone
         return zones
 
+    def request(self, command, data=None, timeout=None):
+        """
+        Send a request and return its result.
+
+        The methods above return None when the core doesn't answer, this
+        raises RoonApiTimeoutException after timeout seconds (request_timeout
+        by default) and RoonApiException if the request can't be sent.
+
+        params:
+            command: the service and method, eg "com.roonlabs.transport:2/get_zones"
+            data: the body of the request
+        """
+        request_id = self._send(command, data)
+        if request_id is None:
+            raise RoonApiException("Unable to send %s" % command)
+        return self._wait(command, request_id, timeout)
+
     def _request(self, command, data=None):
-        """Send command and wait for result."""
+        """Send command and wait for result, None if it doesn't come in time."""
+        request_id = self._send(command, data)
+        if request_id is None:
+            return None
+        try:
+            return self._wait(command, request_id)
+        except RoonApiTimeoutException as exc:
+            LOGGER.warning("%s", exc)
+            return None
+
+    def _send(self, command, data=None):
+        """Send command, returns the request id to wait on or None."""
         LOGGER.debug("_request: command: %s", command)
         if not self._roonsocket:
             retries = 20
@@ -988,28 +1239,28 @@ class RoonApi:  # pylint: disable=too-many-instance-attributes, too-many-lines
                 if not self._roonsocket:
                     return None
         LOGGER.debug("_request: sending")
-        request_id = self._roonsocket.send_request(command, data)
-        result = None
-        retries = 50
-        while retries:
-            result = self._roonsocket.results.get(request_id)
-            LOGGER.debug(
-                "request: command: %s, retry: %d, success: %s",
-                command,
-                retries,
-                result is not None,
+        request_id = self._roonsocket.send_request(command, data, expect_reply=True)
+        if request_id is False:
+            return None
+        return request_id
+
+    def _wait(self, command, request_id, timeout=None):
+        """Wait for the reply to a request sent with _send, raises on timeout."""
+        if timeout is None:
+            timeout = self._request_timeout
+        received, result = self._roonsocket.wait_for_result(request_id, timeout)
+        LOGGER.debug("request: command: %s, success: %s", command, received)
+        if not received:
+            raise RoonApiTimeoutException(
+                "No reply to %s within %ss" % (command, timeout)
             )
-            if result:
-                break
-            retries -= 1
-
-            time.sleep(0.05)
-        try:
-            del self._roonsocket.results[request_id]
-        except KeyError:
-            pass
         return result
 
+    def _cancel(self, request_id):
+        """Give up on a request sent with _send."""
+        if self._roonsocket:
+            self._roonsocket.cancel(request_id)
+
     def _socket_watcher(self):
         """Monitor the connection state of the socket and reconnect if needed."""
         while not self._exit:
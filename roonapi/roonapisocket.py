@@ -5,6 +5,7 @@ import threading
 import websocket
 
 from .constants import LOGGER, REGISTERED, SERVICE_PING, CONTROL_VOLUME
+from .moomessage import MOOMessage
 
 try:
     import simplejson as json
@@ -27,6 +28,30 @@ class RoonApiWebSocket(
         """Return the result of the previous request."""
         return self._results
 
+    def wait_for_result(self, request_id, timeout):
+        """
+        Block until the reply for request_id arrives or timeout expires.
+
+        Returns a tuple (received, result). received is False on timeout or if
+        the connection closed before the reply arrived. The pending entry is
+        always cleared, so a late reply is dropped instead of accumulating.
+        """
+        with self._pending_lock:
+            event = self._pending.get(request_id)
+        if event is not None:
+            event.wait(timeout)
+        with self._pending_lock:
+            self._pending.pop(request_id, None)
+            received = request_id in self._results
+            result = self._results.pop(request_id, None)
+        return received, result
+
+    def cancel(self, request_id):
+        """Stop waiting for request_id, its reply is dropped when it arrives."""
+        with self._pending_lock:
+            self._pending.pop(request_id, None)
+            self._results.pop(request_id, None)
+
     def register_connected_callback(self, callback):
         """To be called on connection."""
         self._connected_callback = callback
@@ -68,6 +93,8 @@ class RoonApiWebSocket(
 
         self._socket = None
         self._results = {}
+        self._pending = {}
+        self._pending_lock = threading.Lock()
         self._requestid = 10  # initial request_id of 10 to prevent confusion with the requests that are sent by the server at initialization
         self._subkey = 0
         self._exit = False
@@ -124,26 +151,10 @@ class RoonApiWebSocket(
         if not message:
             message = w_socket  # compatability fix because of change in websocket-client v0.49
         try:
-            message = message.decode("utf-8")
-            lines = message.split("\n")
-            header = lines[0]
-            body = ""
-
-            request_id = None
-            line_with_request_id = [
-                line for line in lines if line.startswith("Request-Id")
-            ]
-            if line_with_request_id:
-                request_id = int(line_with_request_id[0].split("Request-Id: ")[1])
-
-            if "Content-Type:" in message:
-                # Roon uses a blank line after the header to indicate body.
-                # See https://github.com/RoonLabs/node-roon-api/blob/master/moomsg.js#L45
-                body = "".join(message.split("\n\n")[1:])
-            elif "Logging:" not in message:
-                body = header
-            if body and "{" in body:
-                body = json.loads(body)
+            moo = MOOMessage(message)
+            header = moo.first_line
+            request_id = moo.request_id
+            body = moo.content
             # handle message
             if SERVICE_PING in header:
                 # reply to incoming ping from server
@@ -161,7 +172,7 @@ class RoonApiWebSocket(
                 self._subscriptions[request_id]["callback"](body)
             else:
                 # this is just a result for one of our requests
-                self._results[request_id] = body
+                self._resolve(request_id, body)
         except websocket.WebSocketConnectionClosedException:
             # This can happen while closing a connection - so ignore
             pass
@@ -180,9 +191,27 @@ class RoonApiWebSocket(
         """Handle closing the session."""
         LOGGER.debug("session closed (%s) %s", close_msg, close_status_code)
         self.connected = False
-        self._requestid = 10
         self._subkey = 0
         self._subscriptions = {}
+        # fail anyone still waiting, their replies will never arrive. Request
+        # ids keep counting up on the next connection, so a waiter woken late
+        # can't take the reply of a new request with its id
+        with self._pending_lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._results.clear()
+        for event in pending:
+            event.set()
+
+    def _resolve(self, request_id, body):
+        """Store the reply for a pending request and wake up its waiter."""
+        with self._pending_lock:
+            event = self._pending.get(request_id)
+            if event is None:
+                LOGGER.debug("Dropping reply for unknown request %s", request_id)
+                return
+            self._results[request_id] = body
+        event.set()
 
     # pylint: disable=unused-argument
     def on_open(self, w_socket=None):
@@ -222,15 +251,27 @@ class RoonApiWebSocket(
         self._socket.send(msg, 0x2)
 
     def send_request(
-        self, command, body=None, content_type="application/json", header_type="REQUEST"
+        self,
+        command,
+        body=None,
+        content_type="application/json",
+        header_type="REQUEST",
+        expect_reply=False,
     ):
-        """Send request to the roon sever."""
+        """
+        Send request to the roon sever.
+
+        If expect_reply is set, the reply is kept for wait_for_result,
+        otherwise it is dropped when it arrives.
+        """
         if not self.connected:
             LOGGER.error("Connection is not (yet) ready!")
             return False
-        request_id = self._requestid
-        self._requestid += 1
-        self._results[request_id] = None
+        with self._pending_lock:
+            request_id = self._requestid
+            self._requestid += 1
+            if expect_reply:
+                self._pending[request_id] = threading.Event()
         if body is None:
             msg = "MOO/1 REQUEST %s\nRequest-Id: %s\n\n" % (command, request_id)
         else:
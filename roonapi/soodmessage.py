@@ -28,7 +28,7 @@ class FormatException(Exception):
 
     def __init__(self, message):
         """Init with the message that causes the error."""
-        Exception.__init__()
+        Exception.__init__(self, message)
         self.message = message
 
 
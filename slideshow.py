@@ -0,0 +1,380 @@
+import os
+import json
+import time
+import bisect
+import random
+import hashlib
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Deque, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from PIL import Image, ImageOps
+
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tiff"}
+
+
+class Picture(NamedTuple):
+    name: str
+    size: int
+    mtime: float
+
+
+class SlideshowCatalogue:
+    """
+    The pictures in the slideshow folder.
+
+    The folder is scanned once and rescanned only when its mtime changes, which
+    happens whenever a file is added, removed or renamed. The mtime is checked
+    at most every check_interval seconds, so lookups are O(1) dict hits.
+    """
+
+    def __init__(self, folder: str, check_interval: float = 2.0) -> None:
+        self.folder = folder
+        self.check_interval = check_interval
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.pictures: Dict[str, Picture] = {}
+        self.sorted_names: List[str] = []
+        self.version = 0
+        self.folder_mtime: Optional[float] = None
+        self.checked_at = 0.0
+
+    def __contains__(self, name: str) -> bool:
+        self.refresh()
+        return name in self.pictures
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self.pictures)
+
+    def get(self, name: str) -> Optional[Picture]:
+        self.refresh()
+        return self.pictures.get(name)
+
+    def names(self) -> List[str]:
+        self.refresh()
+        return self.sorted_names
+
+    def refresh(self, force: bool = False) -> bool:
+        """Rescan the folder if it changed, returns True if it did"""
+        now = time.monotonic()
+        if not force and now - self.checked_at < self.check_interval:
+            return False
+        with self.lock:
+            self.checked_at = now
+            try:
+                mtime = os.stat(self.folder).st_mtime
+            except OSError:
+                mtime = None
+            if not force and mtime == self.folder_mtime and self.version:
+                return False
+            self.folder_mtime = mtime
+            self.__scan()
+            return True
+
+    def __scan(self) -> None:
+        pictures = {}
+        try:
+            entries = list(os.scandir(self.folder))
+        except OSError:
+            self.logger.warning(f"Unable to read slideshow folder {self.folder}")
+            entries = []
+        for entry in entries:
+            if os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+            pictures[entry.name] = Picture(entry.name, stat.st_size, stat.st_mtime)
+
+        # Swap in new objects so readers never see a half built catalogue
+        self.pictures = pictures
+        self.sorted_names = sorted(pictures)
+        self.version += 1
+        self.logger.info(f"slideshow catalogue: {len(pictures)} pictures")
+
+
+def render_derivative(
+    source: str, target: str, width: int, height: int, image_format: str
+) -> str:
+    """
+    Write a copy of source scaled to fit width x height, upright per its EXIF
+    orientation. Runs in a worker process.
+    """
+    with Image.open(source) as img:
+        # Let the JPEG decoder downscale, allowing for a 90 degree EXIF rotation
+        img.draft("RGB", (max(width, height), max(width, height)))
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((width, height), Image.Resampling.LANCZOS)
+        if image_format == "jpeg" or img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGB")
+        tmp = target + ".tmp"
+        img.save(tmp, format=image_format.upper(), quality=85)
+    os.replace(tmp, target)
+    return target
+
+
+class SlideshowDerivatives:
+    """
+    Display-sized copies of the slideshow pictures.
+
+    Derivatives are rendered by a process pool into folder, named after a hash
+    of the picture name, size and mtime plus the target size and format, so
+    an edited picture gets a new derivative and stale ones are pruned. The
+    pool is shut down once nothing is queued and started again when needed.
+    """
+
+    MIMETYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+    # Each worker imports the server's modules again, mind a 512 MB Pi
+    MAX_WORKERS = 2
+
+    def __init__(
+        self,
+        catalogue: SlideshowCatalogue,
+        folder: str,
+        width: int,
+        height: int,
+        format: str = "webp",
+        workers: Optional[int] = None,
+    ) -> None:
+        self.catalogue = catalogue
+        self.folder = folder
+        self.width = width
+        self.height = height
+        self.format = format
+        self.mimetype = self.MIMETYPES[format]
+        self.workers = workers or min(os.cpu_count() or 1, self.MAX_WORKERS)
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.pending: Set[str] = set()
+        self.scheduled_version = -1
+        os.makedirs(folder, exist_ok=True)
+
+    def key(self, picture: Picture) -> str:
+        source = f"{picture.name}:{picture.size}:{picture.mtime}"
+        target = f"{self.width}x{self.height}"
+        return hashlib.sha1(f"{source}:{target}".encode()).hexdigest()
+
+    def path(self, picture: Picture) -> str:
+        return os.path.join(self.folder, f"{self.key(picture)}.{self.format}")
+
+    def get(self, name: str) -> Optional[str]:
+        """Path of the derivative if it is ready, otherwise queue it"""
+        picture = self.catalogue.get(name)
+        if picture is None:
+            return None
+        if self.catalogue.version != self.scheduled_version:
+            self.schedule_all()
+        path = self.path(picture)
+        if os.path.exists(path):
+            return path
+        self.__schedule(picture)
+        return None
+
+    def schedule_all(self) -> None:
+        """Queue every picture without a derivative and prune stale files"""
+        self.scheduled_version = self.catalogue.version
+        wanted = set()
+        for name in self.catalogue.names():
+            picture = self.catalogue.get(name)
+            if picture is None:
+                continue
+            path = self.path(picture)
+            wanted.add(os.path.basename(path))
+            if not os.path.exists(path):
+                self.__schedule(picture)
+        with self.lock:
+            pending = set(self.pending)
+        for entry in os.scandir(self.folder):
+            if entry.name not in wanted and entry.name.split(".")[0] not in pending:
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def __schedule(self, picture: Picture) -> None:
+        key = self.key(picture)
+        with self.lock:
+            if key in self.pending:
+                return
+            self.pending.add(key)
+            if self.pool is None:
+                # Forking this multithreaded server could copy a held lock
+                self.pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                )
+            # Under the lock, so the pool can't be shut down as idle first
+            future = self.pool.submit(
+                render_derivative,
+                os.path.join(self.catalogue.folder, picture.name),
+                self.path(picture),
+                self.width,
+                self.height,
+                self.format,
+            )
+        future.add_done_callback(lambda f: self.__done(key, picture.name, f))
+
+    def __done(self, key: str, name: str, future) -> None:
+        idle = None
+        with self.lock:
+            self.pending.discard(key)
+            if not self.pending:
+                idle, self.pool = self.pool, None
+        if idle is not None:
+            # Don't keep the workers resident between batches
+            idle.shutdown(wait=False)
+        if future.exception() is not None:
+            self.logger.error(f"Unable to render {name}: {future.exception()}")
+
+
+class SlideshowScheduler:
+    """
+    The order the slideshow is shown in, owned by the server.
+
+    Slides are drawn one at a time with a weighted random choice that skips
+    the pictures shown in the last `history` draws, and pictures modified in
+    the last recent_days weigh recent_weight times more. Each slide is a
+    clock slide (None) with probability clock_ratio.
+
+    Drawn slides form one sequence addressed by absolute position, so every
+    browser reading it with its own cursor sees the same order and the same
+    cursor always returns the same slides. The position and history are saved
+    to state_file so restarts do not bring back pictures just shown.
+    """
+
+    def __init__(
+        self,
+        catalogue: SlideshowCatalogue,
+        state_file: Optional[str] = None,
+        history: int = 100,
+        clock_ratio: float = 0.0,
+        recent_days: int = 30,
+        recent_weight: float = 1.0,
+        buffer_size: int = 500,
+    ) -> None:
+        self.catalogue = catalogue
+        self.state_file = state_file
+        self.history_size = history
+        self.clock_ratio = clock_ratio
+        self.recent_days = recent_days
+        self.recent_weight = recent_weight
+        self.buffer_size = buffer_size
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.random = random.Random()
+        self.sequence: List[Optional[str]] = []
+        self.start = 0
+        self.history: Deque[str] = deque(maxlen=history)
+        self.weights_version = -1
+        self.names: List[str] = []
+        self.cumulative: List[float] = []
+        self.__load()
+
+    def upcoming(
+        self, cursor: Optional[int], limit: int
+    ) -> Tuple[int, List[Optional[str]]]:
+        """
+        Return (cursor, slides) with up to limit slides from cursor on.
+
+        Without a cursor, or with one from before a restart, reading starts at
+        the next slide not drawn yet. A limit below 1 is read as 1.
+        """
+        limit = max(limit, 1)
+        with self.lock:
+            end = self.start + len(self.sequence)
+            if cursor is None or cursor > end:
+                cursor = end
+            cursor = max(cursor, self.start)
+            drawn = False
+            while self.start + len(self.sequence) < cursor + limit:
+                slide = self.__draw()
+                if slide is False:
+                    break
+                self.sequence.append(slide)
+                drawn = True
+
+            offset = cursor - self.start
+            slides = self.sequence[offset : offset + limit]
+            if len(self.sequence) > self.buffer_size:
+                trim = len(self.sequence) - self.buffer_size
+                del self.sequence[:trim]
+                self.start += trim
+            if drawn:
+                self.__save()
+            return cursor, slides
+
+    def __draw(self):
+        """Pick the next slide, None is the clock, False if there is nothing"""
+        self.__update_weights()
+        if not self.names:
+            return False
+        # Drawn for each slide on its own, as the page used to, so a ratio
+        # of 1.0 shows only the clock
+        if self.random.random() < self.clock_ratio:
+            return None
+
+        window = min(self.history_size, len(self.names) - 1)
+        recent = set(list(self.history)[-window:]) if window else set()
+        name = None
+        total = self.cumulative[-1]
+        for _ in range(32):
+            index = bisect.bisect_right(self.cumulative, self.random.random() * total)
+            candidate = self.names[min(index, len(self.names) - 1)]
+            if candidate not in recent:
+                name = candidate
+                break
+        if name is None:
+            # Nearly everything was shown recently, pick from what is left
+            name = self.random.choice([n for n in self.names if n not in recent])
+        self.history.append(name)
+        return name
+
+    def __update_weights(self) -> None:
+        names = self.catalogue.names()
+        if self.catalogue.version == self.weights_version:
+            return
+        self.weights_version = self.catalogue.version
+        cutoff = time.time() - self.recent_days * 86400
+        cumulative = []
+        total = 0.0
+        for name in names:
+            picture = self.catalogue.get(name)
+            recent = picture is not None and picture.mtime >= cutoff
+            total += self.recent_weight if recent else 1.0
+            cumulative.append(total)
+        self.names, self.cumulative = names, cumulative
+
+    def __load(self) -> None:
+        if not self.state_file or not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+            self.start = int(state.get("position", 0))
+            self.history.extend(state.get("history", []))
+        except (OSError, ValueError):
+            self.logger.warning(f"Ignoring unreadable {self.state_file}")
+
+    def __save(self) -> None:
+        if not self.state_file:
+            return
+        state = {
+            "position": self.start + len(self.sequence),
+            "history": list(self.history),
+        }
+        tmp = self.state_file + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp, self.state_file)
+        except OSError:
+            self.logger.warning(f"Unable to save {self.state_file}")
@@ -14,13 +14,9 @@ function show_row(id) {
         document.getElementById(id).classList.remove('d-none');
     }
 
-// Trigger initial album update
-setTimeout(function() {
-        console.log('Triggering album update');
-        socket.emit('trigger_album_update'); 
-    }, 2000);
+socket.on('album_update', update_album);
 
-socket.on('album_update', function(data) {
+function update_album(data) {
     console.log('Album update received:', data)
 
     if (data.url !== undefined) {
@@ -58,7 +54,7 @@ socket.on('album_update', function(data) {
         console.log("showing slideshow");
         slideshow.setShowAlbum(false);
     }
-});
+}
 
 socket.on('response', function(data) {
     console.log('Response received:', data);
@@ -111,12 +107,14 @@ function on_window_load(
     transition_seconds,
     clock_offset,
     clock_size,
+    album,
 ) {
     slideshow.init({
         showRow: show_row,
-        slideshowClockRatio:  slideshow_clock_ratio ,
         transitionSeconds:  transition_seconds
     });
+    // Start from the album the server rendered, updates arrive on the socket
+    update_album(album);
 
     // Start the clock
     if (slideshow_clock_ratio > 0) {
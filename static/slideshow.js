@@ -1,24 +1,64 @@
 const slideshow = (function() {
-    let currentIndex = 0;
-    let slides = [];
-    let totalSlides = 0;
-    let shuffledIndices = [];
+    // Only the next two slides are kept as preloaded Image objects besides
+    // the one on screen, the order lives on the server and is fetched in batches.
+    const RING_SIZE = 2;
+    const LOW_WATER = 5;
+    let ring = [];
+    let upcoming = [];
+    let cursor = null;
+    let fetching = false;
+    let started = false;
+    let container = null;
     let showAlbum = false;
-    let slideshowClockRatio = 0;
     let transitionSeconds = 0;
     let showRow = null
     let lastShown = "slideshow";
 
-    function shuffleArray(array) {
-        for (let i = array.length - 1; i > 0; i--) {
-            const j = Math.floor(Math.random() * (i + 1));
-            [array[i], array[j]] = [array[j], array[i]];
+    function fetchBatch() {
+        if (fetching) {
+            return;
+        }
+        fetching = true;
+        let url = '/slideshow/manifest';
+        if (cursor !== null) {
+            url += '?cursor=' + cursor;
         }
+        fetch(url)
+            .then(response => response.json())
+            .then(data => {
+                upcoming.push(...data.items);
+                cursor = data.next_cursor;
+                fetching = false;
+                if (data.items.length > 0) {
+                    fillRing();
+                }
+                if (!started) {
+                    started = true;
+                    showNextSlide();
+                }
+            })
+            .catch(error => {
+                console.log('manifest error:', error);
+                fetching = false;
+            });
     }
 
-    function initShuffledIndices() {
-        shuffledIndices = [...Array(totalSlides).keys()];
-        shuffleArray(shuffledIndices);
+    function fillRing() {
+        while (ring.length < RING_SIZE && upcoming.length > 0) {
+            const item = upcoming.shift();
+            if (item.type === 'clock') {
+                ring.push(item);
+                continue;
+            }
+            const img = new Image();
+            img.className = 'slide';
+            img.alt = 'Slideshow Image';
+            img.src = item.url;
+            ring.push({type: item.type, img: img});
+        }
+        if (upcoming.length < LOW_WATER) {
+            fetchBatch();
+        }
     }
 
     function setShowAlbum(state) {
@@ -26,45 +66,49 @@ const slideshow = (function() {
         if (!showAlbum) {
             showRow(lastShown);
         }
-    }   
+    }
+
+    function showPicture(next) {
+        const previous = container.querySelector('.slide.active');
+        container.appendChild(next);
+        // Let the browser lay the new slide out before fading it in
+        requestAnimationFrame(() => next.classList.add('active'));
+        if (previous) {
+            previous.classList.remove('active');
+            setTimeout(() => previous.remove(), 1000);
+        }
+    }
 
     function showNextSlide() {
         if (showAlbum) {
             return;
         }
+        if (ring.length === 0) {
+            // Nothing preloaded yet, keep showing what is on screen
+            fillRing();
+            return;
+        }
 
-        console.log("slideshowClockRatio: " + slideshowClockRatio);
-
-        if (Math.random() < slideshowClockRatio) {
+        const slide = ring.shift();
+        if (slide.type === 'clock') {
             console.log('showing clock');
             lastShown = "clock"
             showRow(lastShown);
-            ;
         } else {
             console.log('showing next slide');
             lastShown = "slideshow"
             showRow(lastShown);
-            slides[shuffledIndices[currentIndex]].classList.remove('active');
-            currentIndex++;
-            if (currentIndex >= totalSlides) {
-                currentIndex = 0;
-                shuffleArray(shuffledIndices);
-            }
-            slides[shuffledIndices[currentIndex]].classList.add('active');
+            showPicture(slide.img);
         }
+        fillRing();
     }
 
     function init(config) {
-        slideshowClockRatio = config.slideshowClockRatio;
         transitionSeconds = config.transitionSeconds;
         showRow = config.showRow;
 
-        slides = document.querySelectorAll('.slide');
-        totalSlides = slides.length;
-
-        initShuffledIndices();
-        slides[shuffledIndices[0]].classList.add('active');
-        showNextSlide();
+        container = document.querySelector('#slideshow .full-area');
+        fetchBatch();
         setInterval(showNextSlide, transitionSeconds * 1000);
     }
 
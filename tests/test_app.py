@@ -1,5 +1,19 @@
+import os
+import tempfile
 import unittest
-from app import is_screen_on
+
+# Keep the images, caches and state the app writes out of the real cache folder
+CACHE_DIR = tempfile.TemporaryDirectory()
+os.environ["CACHE_FOLDER"] = CACHE_DIR.name
+# No pictures, so the slideshow manifest pages through the generated art
+os.environ["SLIDESHOW_FOLDER"] = os.path.join(CACHE_DIR.name, "pictures")
+
+import app  # noqa: E402
+from app import is_screen_on  # noqa: E402
+
+
+def setUpModule():
+    app.create_app()
 
 
 class TestIsScreenOn(unittest.TestCase):
@@ -39,5 +53,83 @@ class TestIsScreenOn(unittest.TestCase):
         )  # Current hour is exactly on off_hour (overnight)
 
 
+class TestAlbumSnapshot(unittest.TestCase):
+    ALBUM = {
+        "state": "playing",
+        "url": "/art/abc",
+        "artist": "Some Artist",
+        "title": "Some Album",
+        "track": "Some Track",
+    }
+
+    def setUp(self):
+        app.dispatcher.post = lambda event, message: None
+
+    def tearDown(self):
+        app.album_snapshot = {}
+        del app.dispatcher.post
+
+    def test_index_renders_last_album(self):
+        app.notify_clients(self.ALBUM)
+        html = app.app.test_client().get("/").get_data(as_text=True)
+        self.assertIn('src="/art/abc"', html)
+        self.assertIn("Some Artist", html)
+        self.assertNotIn('id="album"\n      class="mytab d-none', html)
+
+    def test_index_without_album(self):
+        html = app.app.test_client().get("/").get_data(as_text=True)
+        self.assertIn('class="mytab d-none container-fluid', html)
+
+    def test_connect_pushes_snapshot(self):
+        app.notify_clients(self.ALBUM)
+        client = app.socketio.test_client(app.app)
+        received = {r["name"]: r["args"][0] for r in client.get_received()}
+        self.assertEqual(received["album_update"], self.ALBUM)
+        client.disconnect()
+
+
+class TestGeneratedArt(unittest.TestCase):
+    def test_serves_pool_only(self):
+        [name] = app.art_pool.add()
+        style, seed = app.ArtPool.split(name)
+        client = app.app.test_client()
+        response = client.get(f"/art/generated/{style}/{seed}.png")
+        self.assertEqual(response.status_code, 200)
+        response.close()
+        seed = (seed + 1) % app.ArtPool.SEED_LIMIT
+        response = client.get(f"/art/generated/{style}/{seed}.png")
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn((style, seed), app.art_store.entries())
+
+
+class TestSlideshowManifest(unittest.TestCase):
+    def test_limit_is_clamped(self):
+        app.art_pool.add()
+        client = app.app.test_client()
+        for limit, expected in ((0, 1), (-5, 1), (3, 3), (500, 100)):
+            page = client.get(f"/slideshow/manifest?limit={limit}").get_json()
+            self.assertEqual(len(page["items"]), expected)
+
+    def test_etag_follows_items(self):
+        app.art_pool.add()
+        client = app.app.test_client()
+        url = "/slideshow/manifest?cursor=0&limit=2"
+        etag, _ = client.get(url).get_etag()
+        self.assertEqual(
+            client.get(url, headers={"If-None-Match": f'"{etag}"'}).status_code, 304
+        )
+        # A restart can hand out the same cursor for other slides
+        schedulers = app.slideshow_scheduler, app.art_scheduler
+        app.slideshow_scheduler = app.art_scheduler = app.SlideshowScheduler(
+            app.art_pool, clock_ratio=1.0
+        )
+        try:
+            response = client.get(url, headers={"If-None-Match": f'"{etag}"'})
+        finally:
+            app.slideshow_scheduler, app.art_scheduler = schedulers
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["items"], [{"type": "clock"}] * 2)
+
+
 if __name__ == "__main__":
     unittest.main()
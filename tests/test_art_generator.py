@@ -0,0 +1,188 @@
+import os
+import tempfile
+import unittest
+
+from art_generator import (
+    STYLES,
+    ArtPool,
+    ArtStore,
+    encode,
+    generate,
+    main,
+    render_mondrian,
+)
+from slideshow import SlideshowScheduler
+
+
+class TestRenderMondrian(unittest.TestCase):
+    def test_seed_is_reproducible(self):
+        first = render_mondrian(1024, 600, seed=7)
+        self.assertEqual(first.mode, "P")
+        self.assertEqual(first.tobytes(), render_mondrian(1024, 600, seed=7).tobytes())
+        self.assertNotEqual(
+            first.tobytes(), render_mondrian(1024, 600, seed=8).tobytes()
+        )
+
+    def test_portrait(self):
+        self.assertEqual(render_mondrian(600, 1024, seed=1).size, (600, 1024))
+
+    def test_encode_formats(self):
+        img = render_mondrian(320, 240, seed=1)
+        self.assertTrue(encode(img, "gif").startswith(b"GIF8"))
+        self.assertTrue(encode(img, "png").startswith(b"\x89PNG"))
+        self.assertTrue(encode(img, "webp").startswith(b"RIFF"))
+
+
+class TestStyles(unittest.TestCase):
+    def test_every_style_is_reproducible(self):
+        for style, render in STYLES.items():
+            with self.subTest(style=style):
+                img = render(600, 1024, 3)
+                self.assertEqual(img.size, (600, 1024))
+                self.assertEqual(img.tobytes(), render(600, 1024, 3).tobytes())
+
+
+class TestArtStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = ArtStore(self.tmp.name, 320, 240)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_generate_is_deterministic(self):
+        self.assertEqual(generate(5, 320, 240), generate(5, 320, 240))
+        self.assertTrue(generate(5, 320, 240).startswith(b"\x89PNG"))
+
+    def test_get_stores_generated_bytes(self):
+        path = self.store.get("albers", 42)
+        self.assertEqual(os.path.basename(path), "albers-320x240-42.png")
+        with open(path, "rb") as f:
+            self.assertEqual(f.read(), generate(42, 320, 240, "albers"))
+        self.assertEqual(self.store.entries(), [("albers", 42)])
+        self.store.discard("albers", 42)
+        self.assertEqual(self.store.entries(), [])
+
+    def test_entries_ignore_other_sizes(self):
+        ArtStore(self.tmp.name, 600, 1024).get("mondrian", 1)
+        self.store.get("mondrian", 2)
+        self.assertEqual(self.store.entries(), [("mondrian", 2)])
+
+    def test_only_stale_temp_files_are_removed(self):
+        fresh = os.path.join(self.tmp.name, "mondrian-320x240-1.png.1.2.tmp")
+        stale = os.path.join(self.tmp.name, "mondrian-320x240-2.png.1.2.tmp")
+        for path in (fresh, stale):
+            with open(path, "wb") as f:
+                f.write(b"partial")
+        old = os.path.getmtime(stale) - ArtStore.STALE_TMP_SECONDS - 1
+        os.utime(stale, (old, old))
+        ArtStore(self.tmp.name, 320, 240)
+        self.assertTrue(os.path.exists(fresh))
+        self.assertFalse(os.path.exists(stale))
+
+    def test_render_batch_in_processes(self):
+        jobs = [("voronoi", 1), ("gradient", 2), ("mondrian", 3)]
+        self.store.render_batch(jobs, workers=2)
+        self.assertEqual(sorted(self.store.entries()), sorted(jobs))
+        with open(self.store.path("gradient", 2), "rb") as f:
+            self.assertEqual(f.read(), generate(2, 320, 240, "gradient"))
+
+
+class TestArtPool(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = ArtStore(self.tmp.name, 320, 240)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_add_renders_in_styles(self):
+        pool = ArtPool(self.store, size=2, styles=["albers"])
+        [name] = pool.add()
+        self.assertIn(name, pool)
+        self.assertEqual(pool.names(), [name])
+        style, seed = ArtPool.split(name)
+        self.assertEqual(style, "albers")
+        self.assertTrue(os.path.exists(self.store.path(style, seed)))
+
+    def test_rotation_keeps_one_extra_round(self):
+        pool = ArtPool(self.store, size=2)
+        names = [pool.add()[0] for _ in range(5)]
+        self.assertEqual(pool.names(), names[-2:])
+        # Replaced images stay around for browsers that still have the URL
+        self.assertIn(names[1], pool)
+        self.assertNotIn(names[0], pool)
+        self.assertEqual(
+            sorted(self.store.entries()),
+            sorted(ArtPool.split(name) for name in names[1:]),
+        )
+
+    def test_reloads_store(self):
+        [name] = ArtPool(self.store, size=2).add()
+        pool = ArtPool(ArtStore(self.tmp.name, 320, 240), size=2)
+        self.assertEqual(pool.names(), [name])
+
+    def test_store_is_capped_at_startup(self):
+        for seed in range(6):
+            self.store.get("gradient", seed)
+        pool = ArtPool(self.store, size=2)
+        self.assertEqual(len(pool.names()), 2)
+        self.assertEqual(self.store.entries(), [("gradient", n) for n in range(2, 6)])
+
+    def test_batch_is_never_pruned(self):
+        main(
+            ["--batch", "3", "--folder", self.tmp.name]
+            + ["--width", "320", "--height", "240", "--styles", "gradient"]
+        )
+        batch = self.store.batch()
+        self.assertEqual(len(batch), 3)
+        pool = ArtPool(self.store, size=1)
+        added = [pool.add()[0] for _ in range(3)]
+        self.assertEqual(
+            pool.names(), [ArtPool.name(*entry) for entry in batch] + added[-1:]
+        )
+        self.assertEqual(
+            sorted(self.store.entries()),
+            sorted(batch + [ArtPool.split(name) for name in added[-2:]]),
+        )
+
+    def test_batch_only(self):
+        self.store.get("albers", 7)
+        self.store.add_batch([("albers", 7)])
+        pool = ArtPool(self.store, size=0)
+        pool.run()
+        self.assertEqual(pool.names(), ["albers-7"])
+
+    def test_run_survives_failed_add(self):
+        class Stop(BaseException):
+            pass
+
+        pool = ArtPool(self.store, size=1)
+        calls = []
+
+        def add(count=1):
+            calls.append(count)
+            if len(calls) == 1:
+                raise OSError("disk full")
+
+        def wait(seconds):
+            if len(calls) == 3:
+                raise Stop()
+
+        pool.add = add
+        pool.wakeup.wait = wait
+        with self.assertLogs("art_generator", "ERROR"), self.assertRaises(Stop):
+            pool.run()
+        self.assertEqual(calls, [1, 1, 1])
+
+    def test_scheduler_draws_from_pool(self):
+        pool = ArtPool(self.store, size=3)
+        pool.add(3)
+        scheduler = SlideshowScheduler(pool, history=10)
+        _, slides = scheduler.upcoming(None, 6)
+        self.assertEqual(len(slides), 6)
+        self.assertTrue(set(slides) <= set(pool.names()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from artcache import AlbumArtCache, sniff_mimetype
+
+
+class TestAlbumArtCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.fetched = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fetch(self, key):
+        self.fetched.append(key)
+        time.sleep(0.05)
+        return b"\xff\xd8\xff" + key.encode() * 10
+
+    def test_fetches_once(self):
+        cache = AlbumArtCache(self.tmp.name, 10000, self.fetch)
+        threads = [threading.Thread(target=cache.get, args=("abc",)) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        path = cache.get("abc")
+        self.assertEqual(self.fetched, ["abc"])
+        self.assertEqual(sniff_mimetype(path), "image/jpeg")
+
+    def test_evicts_least_recently_used(self):
+        cache = AlbumArtCache(self.tmp.name, 50, self.fetch)
+        cache.get("aa")
+        cache.get("bb")
+        cache.get("aa")
+        cache.get("cc")
+        self.assertIn("aa", cache)
+        self.assertNotIn("bb", cache)
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "bb")))
+
+    def test_rejects_bad_keys(self):
+        cache = AlbumArtCache(self.tmp.name, 100, self.fetch)
+        self.assertIsNone(cache.get("../etc/passwd"))
+        self.assertIsNone(cache.get(".."))
+        self.assertIsNone(cache.get("."))
+        self.assertIsNone(cache.get(".hidden"))
+        self.assertEqual(self.fetched, [])
+
+    def test_folder_created_on_first_image(self):
+        folder = os.path.join(self.tmp.name, "art", "600")
+        cache = AlbumArtCache(folder, 10000, self.fetch)
+        self.assertFalse(os.path.exists(folder))
+        self.assertEqual(cache.get("abc"), os.path.join(folder, "abc"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import asyncio
+import http
+import json
+import unittest
+
+from websockets.asyncio.server import serve
+
+from roonapi import AsyncRoonApi, RoonApiTimeoutException
+
+APPINFO = {"extension_id": "test", "display_name": "test"}
+
+
+def frame(verb, name, request_id, body):
+    body = json.dumps(body)
+    return (
+        "MOO/1 %s %s\nRequest-Id: %s\nContent-Length: %s\nContent-Type: application/json\n\n%s"
+        % (verb, name, request_id, len(body), body)
+    ).encode()
+
+
+async def fake_core(websocket):
+    async for message in websocket:
+        header, _, body = message.decode().partition("\n\n")
+        name = header.split("\n")[0].split(" ")[2]
+        request_id = int(header.split("Request-Id: ")[1].split("\n")[0])
+        if name.endswith("/register"):
+            reginfo = {"token": "t", "core_id": "c", "display_name": "Core"}
+            await websocket.send(frame("CONTINUE", "Registered", request_id, reginfo))
+        elif name.endswith("/subscribe_zones"):
+            await websocket.send(
+                frame(
+                    "CONTINUE", "Subscribed", request_id, {"zones": [{"zone_id": "z"}]}
+                )
+            )
+        elif name.endswith("/get_zones"):
+            await websocket.send(
+                frame("COMPLETE", "Success", request_id, {"zones": []})
+            )
+
+
+class TestAsyncRoonApi(unittest.IsolatedAsyncioTestCase):
+    async def test_request_and_subscription(self):
+        async with serve(fake_core, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            api = AsyncRoonApi(APPINFO, None, "127.0.0.1", port)
+            zones = api.subscribe_zones()
+            await api.start(timeout=2)
+            self.assertEqual(api.token, "t")
+            self.assertEqual(
+                await api.request("com.roonlabs.transport:2/get_zones"), {"zones": []}
+            )
+            message = await asyncio.wait_for(zones.__anext__(), 2)
+            self.assertEqual(message, {"zones": [{"zone_id": "z"}]})
+            await api.stop()
+
+    async def test_reconnects_after_rejected_handshake(self):
+        rejected = []
+
+        def process_request(connection, request):
+            if not rejected:
+                rejected.append(request)
+                return connection.respond(http.HTTPStatus.SERVICE_UNAVAILABLE, "busy")
+            return None
+
+        async with serve(
+            fake_core, "127.0.0.1", 0, process_request=process_request
+        ) as server:
+            port = server.sockets[0].getsockname()[1]
+            api = AsyncRoonApi(APPINFO, None, "127.0.0.1", port, reconnect_delay=0.05)
+            with self.assertLogs("roonapi", "WARNING"):
+                await api.start(timeout=2)
+            self.assertEqual(len(rejected), 1)
+            await api.stop()
+
+    async def test_request_timeout_covers_waiting_for_ready(self):
+        class SilentCore:
+            async def send(self, message):
+                pass
+
+        api = AsyncRoonApi(APPINFO, None, "127.0.0.1", 1)
+        api._websocket = SilentCore()
+        loop = asyncio.get_running_loop()
+        loop.call_later(0.2, api._ready.set)
+        started = loop.time()
+        with self.assertRaises(RoonApiTimeoutException):
+            await api.request("com.roonlabs.transport:2/get_zones", timeout=0.3)
+        self.assertLess(loop.time() - started, 0.45)
+
+
+if __name__ == "__main__":
+    unittest.main()
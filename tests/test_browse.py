@@ -0,0 +1,349 @@
+import os
+import tempfile
+import unittest
+
+from roonapi import RoonApi, RoonApiException, RoonApiTimeoutException
+from roonapi.browsecache import BrowseCache
+from roonapi.libraryindex import LibraryIndex
+
+PLAY_ALBUM = {"Play Album": {"Play Now": None, "Queue": None}}
+
+
+def make_library(artists=250):
+    return {
+        "Library": {
+            "Artists": {
+                "Artist %d" % n: {"Album %d" % n: PLAY_ALBUM} for n in range(artists)
+            },
+        },
+        "My Live Radio": {"Radio %d" % n: None for n in range(3)},
+    }
+
+
+class FakeBrowseCore:
+    """
+    The browse service of a core over a tree of dicts, a None leaf is an action.
+    Item keys are handed out per list load and can all be revoked at once.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.keys = {}
+        self.current = ()
+        self.calls = []
+        self.played = []
+        self.replies = {}
+        self.request_id = 0
+        self.max_in_flight = 0
+        self.sessions = set()
+
+    def node(self, path):
+        node = self.tree
+        for title in path:
+            node = node[title]
+        return node
+
+    def browse_browse(self, opts):
+        self.calls.append(("browse", opts.get("item_key")))
+        self.sessions.add(opts.get("multi_session_key"))
+        if opts.get("pop_all"):
+            self.current = ()
+        elif "item_key" in opts:
+            if opts["item_key"] not in self.keys:
+                return "InvalidItemKey"
+            path = self.keys[opts["item_key"]]
+            if self.node(path) is None:
+                self.played.append(path)
+                return {"action": "none"}
+            self.current = path
+        return {"action": "list", "list": {"count": len(self.node(self.current))}}
+
+    def browse_load(self, opts):
+        self.calls.append(("load", opts["offset"]))
+        titles = list(self.node(self.current))
+        items = []
+        for title in titles[opts["offset"] : opts["offset"] + opts["count"]]:
+            path = self.current + (title,)
+            key = "/".join(path)
+            self.keys[key] = path
+            child = self.node(path)
+            if child is None:
+                hint = "action"
+            elif title.startswith("Play "):
+                hint = "action_list"
+            else:
+                hint = "list"
+            items.append({"title": title, "item_key": key, "hint": hint})
+        return {"items": items, "offset": opts["offset"]}
+
+    def send(self, command, data):
+        # Answered at once, but only handed over when waited for
+        self.request_id += 1
+        self.replies[self.request_id] = self.browse_load(data)
+        self.max_in_flight = max(self.max_in_flight, len(self.replies))
+        return self.request_id
+
+    def wait(self, command, request_id):
+        return self.replies.pop(request_id)
+
+    def cancel(self, request_id):
+        self.replies.pop(request_id, None)
+
+    def loads(self):
+        return len([call for call in self.calls if call[0] == "load"])
+
+
+def make_roonapi(core, cache=None, window=4):
+    api = RoonApi.__new__(RoonApi)
+    api._browse_cache = cache or BrowseCache()
+    api._session_caches = {}
+    api._browse_window = window
+    api.browse_browse = core.browse_browse
+    api.browse_load = core.browse_load
+    api._send = core.send
+    api._wait = core.wait
+    api._cancel = core.cancel
+    return api
+
+
+ALBUM_PATH = ["Library", "Artists", "Artist 220", "Album 220"]
+
+
+class TestBrowseCache(unittest.TestCase):
+    def setUp(self):
+        self.core = FakeBrowseCore(make_library())
+        self.api = make_roonapi(self.core)
+
+    def test_repeat_play_skips_the_walk(self):
+        self.assertTrue(self.api.play_media("z1", ALBUM_PATH))
+        first = self.core.loads()
+        self.core.calls = []
+        self.assertTrue(self.api.play_media("z1", ALBUM_PATH, "Queue"))
+        # Only the action list and its actions are loaded the second time
+        self.assertEqual(self.core.loads(), 2)
+        self.assertGreater(first, 5)
+        self.assertEqual(
+            self.core.played,
+            [tuple(ALBUM_PATH) + ("Play Album", "Play Now")]
+            + [tuple(ALBUM_PATH) + ("Play Album", "Queue")],
+        )
+
+    def test_sibling_uses_level_index(self):
+        self.api.play_media("z1", ALBUM_PATH)
+        self.core.calls = []
+        path = ["Library", "Artists", "Artist 150", "Album 150"]
+        self.assertTrue(self.api.play_media("z1", path))
+        # Artist 150 was seen while looking for Artist 220
+        self.assertNotIn(("load", 100), self.core.calls)
+        self.assertIn(("browse", "Library/Artists/Artist 150"), self.core.calls)
+
+    def test_stale_keys_fall_back_to_walk(self):
+        self.api.play_media("z1", ALBUM_PATH)
+        self.core.keys.clear()
+        self.assertTrue(self.api.play_media("z1", ALBUM_PATH))
+        self.assertEqual(len(self.core.played), 2)
+
+    def test_changed_count_drops_level(self):
+        self.api.play_media("z1", ALBUM_PATH)
+        self.core.tree["Library"]["Artists"]["Artist 999"] = {"Album 999": PLAY_ALBUM}
+        path = ["Library", "Artists", "Artist 999", "Album 999"]
+        self.assertTrue(self.api.play_media("z1", path))
+
+    def test_action_item_plays_when_loaded(self):
+        self.assertTrue(self.api.play_media("z1", ["My Live Radio", "Radio 1"]))
+        self.assertTrue(self.api.play_media("z1", ["My Live Radio", "Radio 1"]))
+        self.assertEqual(self.core.played, [("My Live Radio", "Radio 1")] * 2)
+
+    def test_missing_element(self):
+        with self.assertLogs("roonapi", "ERROR"):
+            self.assertIsNone(
+                self.api.play_media("z1", ["Library", "Artists", "Nobody"])
+            )
+
+    def test_list_media(self):
+        path = ["Library", "Artists", "Artist 24"]
+        self.assertEqual(
+            self.api.list_media("z1", path),
+            ["Artist 24"] + ["Artist 24%d" % n for n in range(10)],
+        )
+
+    def test_list_media_leaves_path_alone(self):
+        path = ["Library", "Artists", "__all__"]
+        self.assertEqual(len(self.api.list_media("z1", path)), 250)
+        self.assertEqual(path, ["Library", "Artists", "__all__"])
+        self.assertIsNone(self.api.list_media("z1", ["Nowhere", "__all__"]))
+
+    def test_page_timeout_is_not_raised(self):
+        def wait(command, request_id):
+            raise RoonApiTimeoutException("No reply to %s" % command)
+
+        path = ["Library", "Artists", "__all__"]
+        self.assertEqual(len(self.api.list_media("z1", path)), 250)
+        self.api._wait = wait
+        with self.assertLogs("roonapi", "WARNING"):
+            # the walk to the cached list needs no paging, its items do
+            self.assertEqual(self.api.list_media("z1", path), [])
+            self.assertIsNone(self.api.play_media("z1", ALBUM_PATH))
+
+    def test_ttl(self):
+        now = [0.0]
+        cache = BrowseCache(ttl=10, clock=lambda: now[0])
+        api = make_roonapi(self.core, cache)
+        api.play_media("z1", ALBUM_PATH)
+        self.assertEqual(cache.deepest(ALBUM_PATH)[0], 4)
+        now[0] = 11
+        self.assertEqual(cache.deepest(ALBUM_PATH), (0, None))
+
+
+class TestPipelinedPaging(unittest.TestCase):
+    def setUp(self):
+        self.core = FakeBrowseCore(make_library(artists=1000))
+        self.core.current = ("Library", "Artists")
+
+    def test_pages_in_order_within_window(self):
+        api = make_roonapi(self.core, window=3)
+        titles = [item["title"] for item in api.browse_load_items({"count": 100}, 1000)]
+        self.assertEqual(titles, ["Artist %d" % n for n in range(1000)])
+        self.assertEqual(self.core.max_in_flight, 3)
+        self.assertEqual(self.core.replies, {})
+
+    def test_early_stop_cancels_outstanding(self):
+        api = make_roonapi(self.core, window=4)
+        pages = api.browse_load_pages({"count": 100}, 1000, offset=200)
+        self.assertEqual(next(pages)[0]["title"], "Artist 200")
+        pages.close()
+        self.assertEqual(self.core.replies, {})
+        self.assertEqual(self.core.loads(), 4)
+
+    def test_window_of_one_is_sequential(self):
+        api = make_roonapi(self.core, window=1)
+        self.assertEqual(len(list(api.browse_load_items({"count": 100}, 1000))), 1000)
+        self.assertEqual(self.core.max_in_flight, 1)
+
+
+class TestBrowseGenerators(unittest.TestCase):
+    def setUp(self):
+        self.core = FakeBrowseCore(make_library(artists=1000))
+        self.api = make_roonapi(self.core, window=2)
+
+    def test_iter_browse_pages_lazily(self):
+        items = self.api.iter_browse("z1", ["Library", "Artists"])
+        self.assertEqual(self.core.calls, [])
+        self.assertEqual(next(items)["title"], "Artist 0")
+        # One load per level walked, then a window of two pages
+        self.assertEqual(self.core.loads(), 2 + 2)
+        items.close()
+        self.assertEqual(self.core.replies, {})
+
+    def test_iter_browse_unknown_path(self):
+        self.assertEqual(list(self.api.iter_browse("z1", ["Nowhere"])), [])
+
+    def test_search_browse_stops_at_limit(self):
+        found = self.api.search_browse("z1", ["Library", "Artists"], "Artist 1", 3)
+        self.assertEqual(
+            [item["title"] for item in found], ["Artist 1", "Artist 10", "Artist 11"]
+        )
+        self.assertLess(self.core.loads(), 5)
+
+
+class TestLibraryIndex(unittest.TestCase):
+    def setUp(self):
+        tree = make_library(artists=300)
+        tree["Library"]["Albums"] = {
+            "Harvest": PLAY_ALBUM,
+            "Harvest Moon": PLAY_ALBUM,
+            "Blue": PLAY_ALBUM,
+        }
+        tree["Playlists"] = {"Sunday Morning": PLAY_ALBUM}
+        tree["Genres"] = {"Folk": PLAY_ALBUM, "Jazz": PLAY_ALBUM}
+        self.core = FakeBrowseCore(tree)
+        self.api = make_roonapi(self.core)
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.db_path = os.path.join(folder.name, "library.db")
+        self.index = LibraryIndex(self.api, self.db_path, "z1")
+        self.api._library_index = self.index
+
+    def test_search_ranks_title_matches(self):
+        self.assertEqual(self.index.refresh(), (300 + 3 + 1 + 2, 0))
+        self.assertEqual(
+            self.api.search_local("harv"),
+            [["Library", "Albums", "Harvest"], ["Library", "Albums", "Harvest Moon"]],
+        )
+        self.assertEqual(
+            self.api.search_local("Artist 12", 1), [["Library", "Artists", "Artist 12"]]
+        )
+        self.assertEqual(
+            self.api.search_local("morning"), [["Playlists", "Sunday Morning"]]
+        )
+        self.assertEqual(self.api.search_local('"); DROP'), [])
+        self.assertEqual(self.api.search_local("  "), [])
+        # Crawled on a browse session of its own
+        self.assertEqual(self.core.sessions, {LibraryIndex.SESSION})
+
+    def test_searched_path_plays(self):
+        self.index.refresh()
+        path = self.api.search_local("jazz")[0]
+        self.assertTrue(self.api.play_media("z1", path))
+        self.assertEqual(
+            self.core.played, [("Genres", "Jazz", "Play Album", "Play Now")]
+        )
+
+    def test_refresh_is_incremental(self):
+        self.index.refresh()
+        albums = self.core.tree["Library"]["Albums"]
+        del albums["Blue"]
+        albums["Court and Spark"] = PLAY_ALBUM
+        self.assertEqual(self.index.refresh(), (1, 1))
+        self.assertEqual(self.api.search_local("blue"), [])
+        self.assertEqual(
+            self.api.search_local("spark"), [["Library", "Albums", "Court and Spark"]]
+        )
+        self.assertEqual(self.index.crawled()[("Library", "Albums")][0], 3)
+
+    def test_failed_browse_keeps_indexed_rows(self):
+        self.index.refresh()
+        self.api.browse_browse = lambda opts: "NetworkError"
+        with self.assertLogs("roonapi", "ERROR"):
+            self.assertEqual(self.index.refresh(), (0, 0))
+        self.api.browse_browse = self.core.browse_browse
+        self.api._send = lambda command, data: None
+        with self.assertLogs("roonapi", "ERROR"):
+            self.assertEqual(self.index.refresh(), (0, 0))
+        self.assertEqual(self.api.search_local("jazz"), [["Genres", "Jazz"]])
+
+    def test_same_titles_are_kept_apart(self):
+        class Albums:
+            items = [
+                {"title": "Greatest Hits", "subtitle": "Queen", "hint": "list"},
+                {"title": "Greatest Hits", "subtitle": "ABBA", "hint": "list"},
+            ]
+
+            def iter_browse(self, zone_or_output_id, path, **kwargs):
+                return iter(self.items)
+
+        albums = Albums()
+        index = LibraryIndex(albums, self.db_path, "z1", roots=[("Library", "Albums")])
+        self.assertEqual(index.refresh(), (2, 0))
+        path = ["Library", "Albums", "Greatest Hits"]
+        self.assertEqual(index.search("greatest queen"), [path])
+        self.assertEqual(index.search("abba"), [path])
+        self.assertEqual(index.search("greatest"), [path])
+        self.assertEqual(index.refresh(), (0, 0))
+        albums.items = albums.items[1:]
+        self.assertEqual(index.refresh(), (0, 1))
+        self.assertEqual(index.search("queen"), [])
+
+    def test_index_survives_reopen(self):
+        self.index.refresh()
+        reopened = LibraryIndex(self.api, self.db_path, "z1")
+        self.assertEqual(reopened.search("folk"), [["Genres", "Folk"]])
+
+    def test_not_enabled(self):
+        self.api._library_index = None
+        with self.assertRaises(RoonApiException):
+            self.api.search_local("harvest")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import socket
+import threading
+import time
+import unittest
+from unittest import mock
+
+from roonapi import RoonDiscovery
+from roonapi import discovery
+
+
+def sood_answer(unique_id, http_port="9330"):
+    message = b"SOOD\x02R"
+    for key, value in (("unique_id", unique_id), ("http_port", http_port)):
+        message += bytes([len(key)]) + key.encode()
+        message += len(value).to_bytes(2, "big") + value.encode()
+    return message
+
+
+class FakeCores:
+    """Answers SOOD queries on localhost as the given cores, after dropping some"""
+
+    def __init__(self, unique_ids, drop=0):
+        self.unique_ids = unique_ids
+        self.drop = drop
+        self.queries = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.settimeout(0.1)
+        self.port = self.sock.getsockname()[1]
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while self.running:
+            try:
+                data, sender = self.sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            self.queries += 1
+            if data != discovery.sood_query() or self.queries <= self.drop:
+                continue
+            for unique_id in self.unique_ids:
+                self.sock.sendto(sood_answer(unique_id), sender)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        self.sock.close()
+
+
+class TestRoonDiscovery(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(
+            discovery,
+            "interface_addresses",
+            return_value=[("127.0.0.1", "127.0.0.1")],
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        RoonDiscovery._results.clear()
+        self.addCleanup(RoonDiscovery._results.clear)
+
+    def start_cores(self, unique_ids, drop=0):
+        cores = FakeCores(unique_ids, drop)
+        self.addCleanup(cores.stop)
+        return cores
+
+    def discovery(self, core_id=None, timeout=2):
+        discover = RoonDiscovery(core_id, timeout=timeout)
+        discover.port = self.cores.port
+        return discover
+
+    def test_first_matching_core(self):
+        self.cores = self.start_cores(["other", "wanted"])
+        started = time.monotonic()
+        self.assertEqual(self.discovery("wanted").first(), ("127.0.0.1", "9330"))
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_retries_lost_queries(self):
+        self.cores = self.start_cores(["wanted"], drop=2)
+        self.assertEqual(self.discovery("wanted").first(), ("127.0.0.1", "9330"))
+        self.assertEqual(self.cores.queries, 3)
+
+    def test_remembers_result(self):
+        self.cores = self.start_cores(["wanted"])
+        self.discovery("wanted").first()
+        self.cores.stop()
+        self.assertEqual(self.discovery("wanted").first(), ("127.0.0.1", "9330"))
+        RoonDiscovery.forget("wanted")
+        self.assertEqual(self.discovery("wanted", timeout=0.3).first(), (None, None))
+
+    def test_any_core_is_remembered_by_id(self):
+        self.cores = self.start_cores(["wanted"])
+        self.assertEqual(self.discovery().first(), ("127.0.0.1", "9330"))
+        self.cores.stop()
+        self.assertEqual(self.discovery("wanted").first(), ("127.0.0.1", "9330"))
+
+    def test_all_dedupes_answers(self):
+        self.cores = self.start_cores(["a", "b"])
+        servers = self.discovery(timeout=0.6).all()
+        self.assertEqual(servers, [("127.0.0.1", "9330")] * 2)
+        self.assertGreater(self.cores.queries, 1)
+
+    def test_no_answer(self):
+        self.cores = self.start_cores(["other"])
+        self.assertEqual(self.discovery("wanted", timeout=0.3).first(), (None, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+import os
+import tempfile
+import unittest
+import zoneinfo
+from datetime import datetime
+from unittest import mock
+
+from display import (
+    AutoDisplay,
+    BacklightDisplay,
+    DisplayBackend,
+    DisplayManager,
+    NoopDisplay,
+    XsetDisplay,
+    create_backend,
+    next_transition,
+)
+
+TZ = zoneinfo.ZoneInfo("America/New_York")
+
+
+class TestNextTransition(unittest.TestCase):
+    def test_same_day(self):
+        now = datetime(2024, 5, 1, 8, 30, tzinfo=TZ)
+        self.assertEqual(
+            next_transition(now, 9, 23), datetime(2024, 5, 1, 9, tzinfo=TZ)
+        )
+
+    def test_exactly_on_the_hour_moves_on(self):
+        now = datetime(2024, 5, 1, 9, 0, tzinfo=TZ)
+        self.assertEqual(
+            next_transition(now, 9, 23), datetime(2024, 5, 1, 23, tzinfo=TZ)
+        )
+
+    def test_next_day(self):
+        now = datetime(2024, 5, 1, 23, 15, tzinfo=TZ)
+        self.assertEqual(
+            next_transition(now, 9, 23), datetime(2024, 5, 2, 9, tzinfo=TZ)
+        )
+
+    def test_overnight_range(self):
+        now = datetime(2024, 5, 1, 12, 0, tzinfo=TZ)
+        self.assertEqual(
+            next_transition(now, 22, 6), datetime(2024, 5, 1, 22, tzinfo=TZ)
+        )
+
+    def test_never_when_hours_match(self):
+        self.assertIsNone(next_transition(datetime(2024, 5, 1, tzinfo=TZ), 9, 9))
+
+    def test_across_dst_change(self):
+        # Clocks go forward at 2AM on 10 March 2024 in New York
+        now = datetime(2024, 3, 9, 23, 30, tzinfo=TZ)
+        at = next_transition(now, 9, 23)
+        self.assertEqual(at, datetime(2024, 3, 10, 9, tzinfo=TZ))
+        self.assertEqual(at.timestamp() - now.timestamp(), 8.5 * 3600)
+
+
+class TestDisplayManager(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.clock = datetime(2024, 5, 1, 12, tzinfo=TZ)
+        self.manager = DisplayManager(
+            self.calls.append, 9, 23, TZ, now=lambda: self.clock
+        )
+
+    def test_only_switches_on_change(self):
+        self.manager.update()
+        self.manager.update()
+        self.manager.set_playback("playing")
+        self.manager.set_playback("stopped")
+        self.assertEqual(self.calls, [True])
+
+    def test_playback_keeps_display_on_at_night(self):
+        self.clock = datetime(2024, 5, 1, 23, 30, tzinfo=TZ)
+        self.manager.set_playback("playing")
+        self.manager.set_playback("loading")
+        self.assertEqual(self.calls, [True])
+        self.manager.set_playback("paused")
+        self.assertEqual(self.calls, [True, False])
+
+    def test_failed_switch_is_retried(self):
+        def switch(turn_on):
+            self.calls.append(turn_on)
+            if len(self.calls) == 1:
+                raise OSError("no display")
+
+        self.manager.switch = switch
+        with self.assertLogs("display", "ERROR"):
+            self.manager.update()
+        self.manager.update()
+        self.assertEqual(self.calls, [True, True])
+        self.assertTrue(self.manager.is_on)
+
+    def test_run_retries_failed_switch_soon(self):
+        waits = []
+
+        def wait(seconds=None):
+            waits.append(seconds)
+            self.manager.running = False
+
+        def switch(turn_on):
+            raise OSError("no display")
+
+        self.manager.switch = switch
+        self.manager.wakeup.wait = wait
+        self.manager.running = True
+        with self.assertLogs("display", "ERROR"):
+            self.manager.run()
+        self.assertEqual(waits, [DisplayManager.RETRY_SECONDS])
+
+
+class TestBackends(unittest.TestCase):
+    def test_noop_backend_drives_manager(self):
+        backend = create_backend("off")
+        self.assertIsInstance(backend, NoopDisplay)
+        manager = DisplayManager(
+            backend.set_power,
+            9,
+            23,
+            TZ,
+            now=lambda: datetime(2024, 5, 1, 23, 30, tzinfo=TZ),
+        )
+        manager.update()
+        self.assertFalse(backend.is_on)
+        manager.set_playback("playing")
+        self.assertTrue(backend.is_on)
+
+    def test_backlight_writes_bl_power(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "rpi_backlight"))
+            path = os.path.join(root, "rpi_backlight", "bl_power")
+            with open(path, "w") as f:
+                f.write("0")
+            backend = BacklightDisplay(root)
+            backend.set_power(False)
+            with open(path) as f:
+                self.assertEqual(f.read(), "4")
+            backend.set_power(True)
+            with open(path) as f:
+                self.assertEqual(f.read(), "0")
+
+    def test_backlight_missing(self):
+        with tempfile.TemporaryDirectory() as root:
+            with self.assertRaises(OSError):
+                BacklightDisplay(root)
+
+    def test_on_falls_back_to_xset(self):
+        with mock.patch("display.X11Display", side_effect=OSError("no libXext")):
+            with self.assertLogs("display", "WARNING"):
+                backend = create_backend("on")
+        self.assertIsInstance(backend, AutoDisplay)
+        with mock.patch.object(XsetDisplay, "set_power") as xset:
+            backend.set_power(False)
+        xset.assert_called_once_with(False)
+
+    def test_on_retries_x11_every_call(self):
+        x11 = mock.Mock()
+        x11.set_power.side_effect = [OSError("X not up yet"), None]
+        with mock.patch("display.X11Display", return_value=x11):
+            backend = create_backend("on")
+        with mock.patch.object(XsetDisplay, "set_power") as xset:
+            with self.assertLogs("display", "WARNING"):
+                backend.set_power(True)
+            backend.set_power(False)
+        xset.assert_called_once_with(True)
+        self.assertEqual(
+            x11.set_power.call_args_list, [mock.call(True), mock.call(False)]
+        )
+
+    def test_backend_is_abstract(self):
+        with self.assertRaises(TypeError):
+            DisplayBackend()
+
+    def test_unknown_control(self):
+        with self.assertRaises(ValueError):
+            create_backend("maybe")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from myroonapi import MyRoonApi
+
+# Keep the state the tests save out of the real cache folder
+STATE_DIR = tempfile.TemporaryDirectory()
+os.environ["ROON_STATE_FNAME"] = os.path.join(STATE_DIR.name, "roon_state.json")
+
+
+class FakeRoonApi:
+    def __init__(self, zone):
+        self.zone = zone
+
+    @property
+    def zones(self):
+        return {self.zone["zone_id"]: self.zone} if self.zone else {}
+
+    def zone_by_name(self, name):
+        if self.zone and self.zone["display_name"] == name:
+            return self.zone
+        return None
+
+    def get_image(self, image_key, width, height):
+        return "http://core/api/image/" + image_key
+
+
+def make_zone(state="playing", track="Track", seek=0):
+    return {
+        "zone_id": "z1",
+        "display_name": "Kitchen",
+        "state": state,
+        "now_playing": {
+            "seek_position": seek,
+            "image_key": "img1",
+            "three_line": {"line1": track, "line2": "Artist", "line3": "Album"},
+        },
+    }
+
+
+class TestNotifyOnChange(unittest.TestCase):
+    def setUp(self):
+        self.api = MyRoonApi()
+        self.api.zone_name = "Kitchen"
+        self.api.roonapi = FakeRoonApi(make_zone())
+        self.sent = []
+
+        self.api.notify_clients = self.sent.append
+
+    def update(self, **kwargs):
+        self.api.roonapi.zone = make_zone(**kwargs)
+        self.api._MyRoonApi__state_callback("zones_changed", ["z1"])
+
+    def test_only_visible_changes_are_pushed(self):
+        self.update()
+        self.update(seek=10)
+        self.assertEqual(len(self.sent), 1)
+        self.update(track="Next Track")
+        self.update(state="paused", track="Next Track")
+        self.assertEqual(
+            [(m["state"], m["track"]) for m in self.sent],
+            [("playing", "Track"), ("playing", "Next Track"), ("paused", "Next Track")],
+        )
+
+
+def queue_item(n):
+    return {
+        "image_key": "img%d" % n,
+        "three_line": {"line1": "T%d" % n, "line2": "A", "line3": "B"},
+    }
+
+
+class TestQueueModel(unittest.TestCase):
+    def test_changes_are_applied_and_art_prefetched(self):
+        api = MyRoonApi()
+        api.prefetch_count = 2
+        prefetched = []
+        api.art_cache.prefetch = prefetched.append
+        api.notify_clients = lambda message: None
+        callback = api._MyRoonApi__queue_callback
+
+        callback({"items": [queue_item(n) for n in range(3)]})
+        callback(
+            {
+                "changes": [
+                    {"operation": "remove", "index": 0, "count": 1},
+                    {"operation": "insert", "index": 2, "items": [queue_item(3)]},
+                ]
+            }
+        )
+        self.assertEqual(
+            [item["image_key"] for item in api.queue_items], ["img1", "img2", "img3"]
+        )
+        self.assertEqual(prefetched[-1], ["img1", "img2", "img3"])
+        self.assertEqual(api.last_notified["track"], "T1")
+
+
+class TestStateSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.fname = os.path.join(self.tmp.name, "roon_state.json")
+        self.default_fname = os.environ["ROON_STATE_FNAME"]
+        os.environ["ROON_STATE_FNAME"] = self.fname
+
+    def tearDown(self):
+        os.environ["ROON_STATE_FNAME"] = self.default_fname
+        self.tmp.cleanup()
+
+    def make_api(self, zone_name="Kitchen"):
+        api = MyRoonApi()
+        api.zone_name = zone_name
+        api.notify_clients = lambda message: None
+        return api
+
+    def test_snapshot_served_until_zones_arrive(self):
+        api = self.make_api()
+        api.roonapi = FakeRoonApi(make_zone(track="Saved"))
+        api._MyRoonApi__state_callback("zones_changed", ["z1"])
+
+        api = self.make_api()
+        self.assertEqual(api.cached_zone_data()["track"], "Saved")
+        api.roonapi = FakeRoonApi(None)
+        self.assertEqual(api.get_zone_data()["track"], "Saved")
+        api.roonapi.zone = make_zone(track="Live")
+        self.assertEqual(api.get_zone_data()["track"], "Live")
+
+    def test_snapshot_of_another_zone_is_ignored(self):
+        api = self.make_api()
+        api.roonapi = FakeRoonApi(make_zone())
+        api._MyRoonApi__state_callback("zones_changed", ["z1"])
+        self.assertIsNone(self.make_api("Office").cached_zone_data())
+
+    def test_unreadable_state_is_ignored(self):
+        with open(self.fname, "w") as f:
+            f.write("{not json")
+        with self.assertLogs("myroonapi", "WARNING"):
+            self.assertIsNone(self.make_api().cached_zone_data())
+
+    def test_connect_with_snapshot_from_queue_callback(self):
+        # The queue callback saves album data without a zone_id
+        api = self.make_api()
+        api.saved_state = {
+            "core_id": "core1",
+            "host": "10.0.0.2",
+            "port": 9330,
+            "zone_name": "Kitchen",
+            "zone_id": "z1",
+            "album": {"state": "playing", "track": "Saved"},
+        }
+        for name in ("core_id_fname", "token_fname"):
+            path = os.path.join(self.tmp.name, name)
+            with open(path, "w") as f:
+                f.write("core1" if name == "core_id_fname" else "token")
+            setattr(api, name, path)
+        core = mock.Mock(core_id="core1", zones={}, host="10.0.0.2", port=9330)
+        core.zone_by_name.return_value = None
+        with mock.patch("myroonapi.RoonApi", return_value=core):
+            self.assertTrue(api.connect())
+        core.register_queue_callback.assert_called_once_with(mock.ANY, "z1")
+
+    def test_connects_to_cached_core(self):
+        api = self.make_api()
+        api.saved_state = {"core_id": "core1", "host": "10.0.0.2", "port": 9330}
+        core = mock.Mock(core_id="core1")
+        with mock.patch("myroonapi.RoonApi", return_value=core) as roonapi:
+            self.assertIs(api._MyRoonApi__connect_cached("core1", "token"), core)
+        self.assertEqual(roonapi.call_args[0][2:4], ("10.0.0.2", 9330))
+
+    def test_falls_back_when_cached_core_fails(self):
+        api = self.make_api()
+        api.saved_state = {"core_id": "core1", "host": "10.0.0.2", "port": 9330}
+        other = mock.Mock(core_id="core2")
+        with mock.patch("myroonapi.RoonApi", return_value=other):
+            with self.assertLogs("myroonapi", "WARNING"):
+                self.assertIsNone(api._MyRoonApi__connect_cached("core1", "token"))
+        other.stop.assert_called_once()
+        with mock.patch("myroonapi.RoonApi", side_effect=Exception("timed out")):
+            with self.assertLogs("myroonapi", "WARNING"):
+                self.assertIsNone(api._MyRoonApi__connect_cached("core1", "token"))
+        self.assertIsNone(api._MyRoonApi__connect_cached("core3", "token"))
+
+
+if __name__ == "__main__":
+    unittest.main()
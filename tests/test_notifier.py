@@ -0,0 +1,33 @@
+import unittest
+
+from notifier import NotificationDispatcher
+
+
+class TestNotificationDispatcher(unittest.TestCase):
+    def test_burst_is_coalesced(self):
+        delivered = []
+        dispatcher = NotificationDispatcher(
+            lambda event, message: delivered.append((event, message["n"]))
+        )
+        for n in range(5):
+            dispatcher.post("album_update", {"n": n})
+        dispatcher.post("other", {"n": 9})
+
+        batch = []
+        while not dispatcher.queue.empty():
+            batch.append(dispatcher.queue.get_nowait())
+        dispatcher.dispatch(batch)
+
+        self.assertEqual(delivered, [("album_update", 4), ("other", 9)])
+        self.assertEqual(dispatcher.stats()["coalesced"], 4)
+
+    def test_post_never_blocks_when_full(self):
+        dispatcher = NotificationDispatcher(lambda event, message: None, maxsize=2)
+        for n in range(4):
+            dispatcher.post("album_update", {"n": n})
+        self.assertEqual(dispatcher.stats()["dropped"], 2)
+        self.assertEqual(dispatcher.queue.get_nowait()[2], {"n": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
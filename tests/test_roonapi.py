@@ -0,0 +1,236 @@
+import threading
+import unittest
+
+from roonapi import RoonApi, RoonApiException, RoonApiTimeoutException
+from roonapi.moomessage import MOOFormatException, MOOMessage
+from roonapi.roonapisocket import RoonApiWebSocket
+
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, msg, opcode):
+        self.sent.append(msg)
+
+
+def make_websocket():
+    ws = RoonApiWebSocket("ws://127.0.0.1:9100/api")
+    ws._socket = FakeSocket()
+    ws.connected = True
+    return ws
+
+
+class TestRequestCorrelation(unittest.TestCase):
+    def test_reply_wakes_waiter(self):
+        ws = make_websocket()
+        request_id = ws.send_request("svc/get_zones", expect_reply=True)
+        reply = (
+            'MOO/1 COMPLETE Success\nRequest-Id: %s\nContent-Type: application/json\n\n{"zones": []}'
+            % request_id
+        )
+        threading.Timer(0.01, ws.on_message, (None, reply.encode())).start()
+        received, result = ws.wait_for_result(request_id, 2)
+        self.assertTrue(received)
+        self.assertEqual(result, {"zones": []})
+        self.assertEqual(ws.results, {})
+
+    def test_timeout(self):
+        ws = make_websocket()
+        request_id = ws.send_request("svc/get_zones", expect_reply=True)
+        self.assertEqual(ws.wait_for_result(request_id, 0.01), (False, None))
+
+    def test_close_wakes_waiter(self):
+        ws = make_websocket()
+        request_id = ws.send_request("svc/get_zones", expect_reply=True)
+        ws.on_close(None, 1000, "bye")
+        self.assertEqual(ws.wait_for_result(request_id, 2), (False, None))
+
+    def test_close_fails_waiter_and_ids_are_not_reused(self):
+        ws = make_websocket()
+        old_id = ws.send_request("svc/get_zones", expect_reply=True)
+        ws.on_close(None, 1000, "bye")
+        ws.connected = True
+        new_id = ws.send_request("svc/get_outputs", expect_reply=True)
+        self.assertNotEqual(new_id, old_id)
+        ws.on_message(
+            None,
+            (
+                'MOO/1 COMPLETE Success\nRequest-Id: %s\nContent-Type: application/json\n\n{"outputs": []}'
+                % new_id
+            ).encode(),
+        )
+        # the old waiter, woken late, can't take the new reply
+        self.assertEqual(ws.wait_for_result(old_id, 2), (False, None))
+        self.assertEqual(ws.wait_for_result(new_id, 2), (True, {"outputs": []}))
+
+    def test_request_returns_none_on_timeout(self):
+        api = RoonApi.__new__(RoonApi)
+        api._roonsocket = make_websocket()
+        api._request_timeout = 0.01
+        with self.assertLogs("roonapi", "WARNING"):
+            self.assertIsNone(api._request("svc/get_zones"))
+        self.assertEqual(api._roonsocket._pending, {})
+
+    def test_request_raises_on_timeout(self):
+        api = RoonApi.__new__(RoonApi)
+        api._roonsocket = make_websocket()
+        api._request_timeout = 5
+        with self.assertRaises(RoonApiTimeoutException):
+            api.request("svc/get_zones", timeout=0.01)
+        api._roonsocket.connected = False
+        with self.assertRaises(RoonApiException):
+            api.request("svc/get_zones")
+
+    def test_cancelled_reply_is_dropped(self):
+        ws = make_websocket()
+        request_id = ws.send_request("svc/load", expect_reply=True)
+        ws.cancel(request_id)
+        ws.on_message(
+            None,
+            (
+                'MOO/1 COMPLETE Success\nRequest-Id: %s\nContent-Type: application/json\n\n{"items": []}'
+                % request_id
+            ).encode(),
+        )
+        self.assertEqual(ws.results, {})
+
+    def test_untracked_reply_is_dropped(self):
+        ws = make_websocket()
+        request_id = ws.send_request("svc/unsubscribe_zones")
+        ws.on_message(
+            None, ("MOO/1 COMPLETE Success\nRequest-Id: %s\n\n" % request_id).encode()
+        )
+        self.assertEqual(ws.results, {})
+
+
+class TestMOOMessage(unittest.TestCase):
+    def test_json_body(self):
+        body = '{"title": "caf\u00e9"}'.encode("utf-8") + b"trailing"
+        frame = (
+            b"MOO/1 COMPLETE Success\nRequest-Id: 42\nContent-Length: %d\n"
+            b"Content-Type: application/json\n\n" % (len(body) - 8)
+        ) + body
+        moo = MOOMessage(frame)
+        self.assertEqual(moo.verb, "COMPLETE")
+        self.assertEqual(moo.name, "Success")
+        self.assertEqual(moo.request_id, 42)
+        self.assertIsInstance(moo.body, memoryview)
+        self.assertEqual(moo.content, {"title": "caf\u00e9"})
+
+    def test_without_body(self):
+        moo = MOOMessage(b"MOO/1 REQUEST com.roonlabs.ping:1/ping\nRequest-Id: 3\n\n")
+        self.assertEqual(moo.name, "com.roonlabs.ping:1/ping")
+        self.assertEqual(moo.content, "MOO/1 REQUEST com.roonlabs.ping:1/ping")
+
+    def test_logging_header(self):
+        moo = MOOMessage(b"MOO/1 COMPLETE Success\nRequest-Id: 3\nLogging: quiet\n\n")
+        self.assertEqual(moo.content, "")
+
+    def test_headers_in_any_order(self):
+        body = b'{"seek_position": 13}'
+        frames = [
+            b"MOO/1 CONTINUE Changed\nRequest-Id: 12\nContent-Length: %d\n"
+            b"Content-Type: application/json\n\n" % len(body),
+            b"MOO/1 CONTINUE Changed\nContent-Type: application/json\n"
+            b"Content-Length: %d\nRequest-Id: 12\n\n" % len(body),
+        ]
+        for frame in frames:
+            moo = MOOMessage(frame + body)
+            self.assertEqual(moo.request_id, 12)
+            self.assertEqual(moo.name, "Changed")
+            self.assertEqual(moo.content, {"seek_position": 13})
+            self.assertEqual(
+                moo.headers,
+                {
+                    "Request-Id": "12",
+                    "Content-Length": str(len(body)),
+                    "Content-Type": "application/json",
+                },
+            )
+
+    def test_bad_prefix(self):
+        self.assertRaises(MOOFormatException, MOOMessage, b"HTTP/1.1 200 OK")
+
+
+def make_roonapi():
+    api = RoonApi.__new__(RoonApi)
+    api._zones = {}
+    api._outputs = {}
+    api._state_callbacks = []
+    api._rebuild_indexes()
+    return api
+
+
+def make_zone(zone_id, name, outputs):
+    return {
+        "zone_id": zone_id,
+        "display_name": name,
+        "outputs": [{"output_id": o, "display_name": "Out " + o} for o in outputs],
+    }
+
+
+class TestZoneIndexes(unittest.TestCase):
+    def test_lookups_follow_state_changes(self):
+        api = make_roonapi()
+        api._on_state_change({"zones": [make_zone("z1", "Kitchen", ["o1"])]})
+        api._on_state_change(
+            {
+                "outputs_added": [
+                    {"output_id": "o1", "display_name": "Out o1", "zone_id": "z1"}
+                ]
+            }
+        )
+        self.assertEqual(api.zone_by_name("Kitchen")["zone_id"], "z1")
+        self.assertEqual(api.zone_by_output_id("o1")["zone_id"], "z1")
+        self.assertEqual(api.zone_by_output_name("Out o1")["zone_id"], "z1")
+        self.assertEqual(api.output_by_name("Out o1")["output_id"], "o1")
+
+        api._on_state_change({"zones_changed": [make_zone("z1", "Den", ["o1"])]})
+        self.assertIsNone(api.zone_by_name("Kitchen"))
+        self.assertEqual(api.zone_by_name("Den")["zone_id"], "z1")
+
+        api._on_state_change(
+            {"zones_seek_changed": [{"zone_id": "z1", "seek_position": 3}]}
+        )
+        self.assertEqual(api.zone_by_name("Den")["seek_position"], 3)
+
+        api._on_state_change({"zones_removed": ["z1"], "outputs_removed": ["o1"]})
+        self.assertIsNone(api.zone_by_name("Den"))
+        self.assertIsNone(api.zone_by_output_id("o1"))
+        self.assertIsNone(api.output_by_name("Out o1"))
+
+    def test_removals_drop_reverse_entries(self):
+        api = make_roonapi()
+        api._on_state_change({"zones": [make_zone("z1", "Kitchen", ["o1"])]})
+        api._on_state_change({"zones_removed": ["z1"]})
+        self.assertEqual(api._output_ids_by_name, {})
+        self.assertEqual(api._zone_ids_by_output_id, {})
+
+        api._on_state_change(
+            {
+                "outputs": [
+                    {"output_id": "o2", "display_name": "Out o2", "zone_id": "z2"}
+                ]
+            }
+        )
+        api._on_state_change({"outputs_removed": ["o2"]})
+        self.assertEqual(api._output_ids_by_name, {})
+        self.assertEqual(api._zone_ids_by_output_id, {})
+
+    def test_zone_removal_keeps_known_output(self):
+        api = make_roonapi()
+        api._on_state_change({"zones": [make_zone("z1", "Kitchen", ["o1"])]})
+        api._on_state_change(
+            {
+                "outputs": [
+                    {"output_id": "o1", "display_name": "Out o1", "zone_id": "z1"}
+                ]
+            }
+        )
+        api._on_state_change({"zones_removed": ["z1"]})
+        self.assertEqual(api.output_by_name("Out o1")["output_id"], "o1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import tempfile
+import time
+import unittest
+
+from PIL import Image
+
+from slideshow import (
+    SlideshowCatalogue,
+    SlideshowDerivatives,
+    SlideshowScheduler,
+    render_derivative,
+)
+
+
+class TestSlideshowCatalogue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = self.tmp.name
+        for name in ("b.jpg", "a.PNG", "notes.txt"):
+            with open(os.path.join(self.folder, name), "wb") as f:
+                f.write(b"x" * 10)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_scan_filters_extensions(self):
+        catalogue = SlideshowCatalogue(self.folder)
+        self.assertEqual(catalogue.names(), ["a.PNG", "b.jpg"])
+        self.assertIn("b.jpg", catalogue)
+        self.assertNotIn("notes.txt", catalogue)
+        self.assertEqual(catalogue.get("b.jpg").size, 10)
+
+    def test_rescans_when_folder_changes(self):
+        catalogue = SlideshowCatalogue(self.folder, check_interval=0)
+        version = catalogue.version if catalogue.names() else None
+        os.remove(os.path.join(self.folder, "b.jpg"))
+        os.utime(self.folder, (0, 0))
+        self.assertNotIn("b.jpg", catalogue)
+        self.assertGreater(catalogue.version, version)
+
+    def test_missing_folder(self):
+        catalogue = SlideshowCatalogue(os.path.join(self.folder, "nope"))
+        self.assertEqual(catalogue.names(), [])
+
+
+class TestSlideshowDerivatives(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pictures = os.path.join(self.tmp.name, "pictures")
+        os.makedirs(self.pictures)
+        exif = Image.Exif()
+        exif[0x0112] = 6  # stored sideways, rotate 90 degrees to display
+        Image.new("RGB", (2000, 1000), "red").save(
+            os.path.join(self.pictures, "photo.jpg"), exif=exif
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_render_is_upright_and_display_sized(self):
+        target = os.path.join(self.tmp.name, "out.webp")
+        render_derivative(
+            os.path.join(self.pictures, "photo.jpg"), target, 1024, 600, "webp"
+        )
+        with Image.open(target) as img:
+            self.assertEqual(img.format, "WEBP")
+            self.assertEqual(img.size, (300, 600))
+
+    def test_served_once_rendered(self):
+        catalogue = SlideshowCatalogue(self.pictures)
+        derivatives = SlideshowDerivatives(
+            catalogue, os.path.join(self.tmp.name, "cache"), 1024, 600, "jpeg", 1
+        )
+        self.assertIsNone(derivatives.get("photo.jpg"))
+        for _ in range(200):
+            if derivatives.pool is None:
+                break
+            time.sleep(0.05)
+        # The workers are let go once nothing is queued
+        self.assertIsNone(derivatives.pool)
+        path = derivatives.get("photo.jpg")
+        self.assertTrue(path.endswith(".jpeg"))
+        self.assertIsNone(derivatives.get("missing.jpg"))
+
+    def test_workers_are_capped(self):
+        derivatives = SlideshowDerivatives(
+            SlideshowCatalogue(self.pictures), self.tmp.name, 1024, 600
+        )
+        self.assertLessEqual(derivatives.workers, SlideshowDerivatives.MAX_WORKERS)
+
+
+class TestSlideshowScheduler(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pictures = os.path.join(self.tmp.name, "pictures")
+        os.makedirs(self.pictures)
+        for n in range(10):
+            with open(os.path.join(self.pictures, "%d.jpg" % n), "wb") as f:
+                f.write(b"x")
+        self.catalogue = SlideshowCatalogue(self.pictures)
+        self.state_file = os.path.join(self.tmp.name, "state.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_no_repeats_within_history(self):
+        scheduler = SlideshowScheduler(self.catalogue, history=9)
+        cursor, slides = scheduler.upcoming(None, 30)
+        self.assertEqual(cursor, 0)
+        for start in range(0, 20, 10):
+            self.assertEqual(len(set(slides[start : start + 10])), 10)
+
+    def test_limit_below_one_reads_one(self):
+        scheduler = SlideshowScheduler(self.catalogue)
+        _, slides = scheduler.upcoming(None, 3)
+        for limit in (0, -4):
+            self.assertEqual(scheduler.upcoming(1, limit), (1, slides[1:2]))
+
+    def test_cursor_is_stable_and_shared(self):
+        scheduler = SlideshowScheduler(self.catalogue)
+        _, first = scheduler.upcoming(None, 5)
+        _, again = scheduler.upcoming(0, 5)
+        self.assertEqual(first, again)
+        cursor, _ = scheduler.upcoming(None, 5)
+        self.assertEqual(cursor, 5)
+
+    def test_history_survives_restart(self):
+        scheduler = SlideshowScheduler(self.catalogue, self.state_file, history=9)
+        _, shown = scheduler.upcoming(None, 5)
+        restarted = SlideshowScheduler(self.catalogue, self.state_file, history=9)
+        cursor, slides = restarted.upcoming(None, 5)
+        self.assertEqual(cursor, 5)
+        self.assertTrue(set(shown).isdisjoint(slides))
+
+    def test_clock_slides(self):
+        scheduler = SlideshowScheduler(self.catalogue, clock_ratio=0.5)
+        _, slides = scheduler.upcoming(None, 400)
+        self.assertTrue(100 < slides.count(None) < 300)
+
+    def test_clock_ratio_of_one_is_clock_only(self):
+        scheduler = SlideshowScheduler(self.catalogue, clock_ratio=1.0)
+        self.assertEqual(scheduler.upcoming(None, 10), (0, [None] * 10))
+
+
+if __name__ == "__main__":
+    unittest.main()